@@ -0,0 +1,459 @@
+"""
+Benchmark suite of the fuzzy_system package.
+
+Measures the latency percentiles, the throughput and the memory allocated per call of
+`FuzzySystem.evaluate_output`, `FuzzySystem.add_rule`, `FuzzyVariableInput.fuzzify` and
+`FuzzySet.union` / `intersection` / `defuzzify_cog`, on the fan controller of `fuzzy_inference_system.ipynb`
+and on synthetic systems sweeping the number of inputs, sets per variable, rules and resolution.
+It also checks that `fuzzy_system` and the tutorials' `fuzzy.py` import within a time budget in a fresh
+interpreter, without importing matplotlib, so that short-lived inference workers start fast, and that the
+scalar, cached and batch inference paths agree after a system is changed in place.
+
+Usage:
+    python benchmark_fuzzy_system.py                        # run and print the results
+    python benchmark_fuzzy_system.py --save baseline.json   # run and store the results as a baseline
+    python benchmark_fuzzy_system.py --compare baseline.json --tolerance 0.25
+        # exits with status 1 when a median latency is more than 25% above the baseline
+    python benchmark_fuzzy_system.py --import-budget 0.3
+        # exits with status 1 when an import takes more than 0.3 s or imports matplotlib
+Baselines are machine dependent, compare only against a baseline recorded on the same machine.
+
+Each benchmark is timed over `--repeats` runs and its median latency is the fastest of the medians of the runs,
+as interference from the rest of the machine only ever slows a run down. The median of a single run of 500 calls
+moves by up to ~30% between runs on a busy machine, the fastest of 5 runs by ~10%: this is the noise floor
+the default tolerance of 25% assumes. `p50_spread` records the spread of the medians of the runs, a benchmark
+whose spread exceeds the tolerance is reported as noisy, raise `--calls` or `--repeats` for it.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, os.path.join(ROOT, 'assignment-2'))
+from fuzzy_system import FuzzySet, FuzzyVariableInput, FuzzyVariableOutput, FuzzySystem  # noqa: E402
+
+
+def build_fan_controller(res: int = 100, parametric: bool = False) -> FuzzySystem:
+    """
+    The fan controller of `fuzzy_inference_system.ipynb`
+    :param res: the resolution of the variables
+    :param parametric: if True, the sets evaluate their membership from their breakpoints
+    :return: the fuzzy system
+    """
+    temp = FuzzyVariableInput('Temperature', 10, 40, res)
+    temp.add_triangular('Cold', 10, 10, 25, parametric)
+    temp.add_triangular('Medium', 15, 25, 35, parametric)
+    temp.add_triangular('Hot', 25, 40, 40, parametric)
+    humidity = FuzzyVariableInput('Humidity', 20, 100, res)
+    humidity.add_triangular('Dry', 20, 20, 60, parametric)
+    humidity.add_trapezoidal('Normal', 30, 60, 75, 90, parametric)
+    humidity.add_triangular('Wet', 60, 100, 100, parametric)
+    speed = FuzzyVariableOutput('Speed', 0, 100, res)
+    speed.add_triangular('Slow', 0, 0, 50, parametric)
+    speed.add_triangular('Moderate', 10, 50, 90, parametric)
+    speed.add_triangular('Fast', 50, 100, 100, parametric)
+    system = FuzzySystem()
+    system.add_input_variable(temp)
+    system.add_input_variable(humidity)
+    system.add_output_variable(speed)
+    system.add_rule({'Temperature': 'Cold', 'Humidity': 'Dry'}, {'Speed': 'Slow'})
+    system.add_rule({'Temperature': 'Medium', 'Humidity': 'Dry'}, {'Speed': 'Slow'})
+    system.add_rule({'Temperature': 'Cold', 'Humidity': 'Normal'}, {'Speed': 'Slow'})
+    system.add_rule({'Temperature': 'Hot', 'Humidity': 'Dry'}, {'Speed': 'Moderate'})
+    system.add_rule({'Temperature': 'Medium', 'Humidity': 'Normal'}, {'Speed': 'Moderate'})
+    system.add_rule({'Temperature': 'Cold', 'Humidity': 'Wet'}, {'Speed': 'Moderate'})
+    system.add_rule({'Temperature': 'Hot', 'Humidity': 'Normal'}, {'Speed': 'Fast'})
+    system.add_rule({'Temperature': 'Hot', 'Humidity': 'Wet'}, {'Speed': 'Fast'})
+    system.add_rule({'Temperature': 'Medium', 'Humidity': 'Wet'}, {'Speed': 'Fast'})
+    return system
+
+
+def add_partition(var: Any, n_sets: int) -> None:
+    """
+    Covers the domain of a variable with `n_sets` evenly spaced triangular sets
+    :param var: the variable
+    :param n_sets: the number of sets
+    """
+    centers = np.linspace(var.min_val, var.max_val, n_sets)
+    step = centers[1] - centers[0]
+    for k, center in enumerate(centers):
+        var.add_triangular(f'S{k}', max(center - step, var.min_val), center, min(center + step, var.max_val))
+
+
+def build_synthetic(n_inputs: int, n_sets: int, n_rules: int, res: int, seed: int = 0) -> FuzzySystem:
+    """
+    A system with `n_inputs` inputs and one output on [0, 100], every variable partitioned by `n_sets` triangular sets,
+    and `n_rules` rules drawn at random (without repetition when possible)
+    :param n_inputs: the number of input variables
+    :param n_sets: the number of sets per variable
+    :param n_rules: the number of rules
+    :param res: the resolution of the variables
+    :param seed: seed of the random generator drawing the rules
+    :return: the fuzzy system
+    """
+    rng = np.random.default_rng(seed)
+    system = FuzzySystem()
+    for i in range(n_inputs):
+        var = FuzzyVariableInput(f'x{i}', 0, 100, res)
+        add_partition(var, n_sets)
+        system.add_input_variable(var)
+    var = FuzzyVariableOutput('y', 0, 100, res)
+    add_partition(var, n_sets)
+    system.add_output_variable(var)
+    n_combinations = n_sets ** n_inputs
+    if n_combinations <= n_rules:
+        antecedents = list(itertools.product(range(n_sets), repeat=n_inputs))
+    else:
+        codes = rng.choice(n_combinations, n_rules, replace=False)
+        antecedents = [np.unravel_index(code, (n_sets,) * n_inputs) for code in codes]
+    for k in range(n_rules):
+        sets = antecedents[k % len(antecedents)]
+        system.add_rule({f'x{i}': f'S{s}' for i, s in enumerate(sets)}, {'y': f'S{rng.integers(n_sets)}'})
+    return system
+
+
+def random_inputs(system: FuzzySystem, n: int, seed: int = 0) -> List[Dict[str, float]]:
+    """
+    Draws `n` random input dicts inside the domains of the input variables
+    """
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.uniform(var.min_val, var.max_val, n).tolist() for name, var in system.input_variables.items()}
+    return [{name: column[k] for name, column in columns.items()} for k in range(n)]
+
+
+def measure(fn: Callable[[int], Any], n_calls: int, n_repeats: int = 5, n_warmup: int = 10) -> Dict[str, float]:
+    """
+    Times `n_repeats` runs of `n_calls` calls of `fn(k)`, k being the call number, then counts the memory they allocate
+    :param fn: the benchmarked callable
+    :param n_calls: the number of timed calls per run
+    :param n_repeats: the number of timed runs
+    :param n_warmup: the number of untimed calls made first
+    :return: a dict of the fastest median latency of the runs and the latency percentiles of all the calls
+             in microseconds, the relative spread of the medians of the runs, calls per second,
+             and the peak memory allocated during a call in bytes (tracemalloc), averaged over the calls
+    """
+    for k in range(n_warmup):
+        fn(k)
+    latencies = np.empty((n_repeats, n_calls))
+    clock = time.perf_counter
+    for run in range(n_repeats):
+        for k in range(n_calls):
+            start = clock()
+            fn(k)
+            latencies[run, k] = clock() - start
+    # allocations are measured in a separate pass, tracemalloc slows the calls down
+    n_traced = min(n_calls, 100)
+    allocated = 0
+    tracemalloc.start()
+    for k in range(n_traced):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        fn(k)
+        allocated += tracemalloc.get_traced_memory()[1] - before
+    tracemalloc.stop()
+    medians = np.median(latencies, axis=1) * 1e6
+    p90, p99 = np.percentile(latencies, [90, 99]) * 1e6
+    return {'p50_us': float(medians.min()),
+            'p50_spread': float(medians.max() / medians.min() - 1),
+            'p90_us': float(p90),
+            'p99_us': float(p99),
+            'calls_per_sec': float(latencies.size / latencies.sum()),
+            'bytes_per_call': allocated / n_traced}
+
+
+def benchmark_system(system: FuzzySystem, n_calls: int, n_repeats: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmarks the inference, the fuzzification and the rule creation of a system
+    """
+    results = {}
+    inputs = random_inputs(system, n_calls)
+    results['evaluate_output'] = measure(lambda k: system.evaluate_output(inputs[k % n_calls]), n_calls, n_repeats)
+    name, var = next(iter(system.input_variables.items()))
+    values = [x[name] for x in inputs]
+    results['fuzzify'] = measure(lambda k: var.fuzzify(values[k % n_calls]), n_calls, n_repeats)
+    # rules are added to a copy, not to alter the benchmarked system
+    rules = [({clause.variable_name: clause.set_key for clause in rule.antecedents},
+              {clause.variable_name: clause.set_key for clause in rule.consequents}) for rule in system.rules]
+    target = FuzzySystem()
+    for input_var in system.input_variables.values():
+        target.add_input_variable(input_var)
+    for output_var in system.output_variables.values():
+        target.add_output_variable(output_var)
+    results['add_rule'] = measure(lambda k: target.add_rule(*rules[k % len(rules)]), n_calls, n_repeats)
+    return results
+
+
+def benchmark_sets(res: int, n_calls: int, n_repeats: int = 5) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmarks the operators and the centroid defuzzification of sampled sets of resolution `res`
+    """
+    a = FuzzySet.create_triangular('a', 0, 100, res, 10, 40, 70)
+    b = FuzzySet.create_trapezoidal('b', 0, 100, res, 30, 50, 60, 90)
+    return {'union': measure(lambda k: a.union(b), n_calls, n_repeats),
+            'intersection': measure(lambda k: a.intersection(b), n_calls, n_repeats),
+            'defuzzify_cog': measure(lambda k: a.defuzzify_cog(), n_calls, n_repeats)}
+
+
+# the modules whose import time is checked, and the directory they are imported from
+IMPORTS = {'fuzzy_system': os.path.join(ROOT, 'assignment-2'),
+           'fuzzy': os.path.join(ROOT, 'tutorials', 'fuzzy-neural-min-max-classifier')}
+
+
+def measure_import(module: str, path: str, n_runs: int = 5) -> Dict[str, Any]:
+    """
+    Imports a module in fresh interpreters, numpy being imported first as every worker needs it anyway
+    :param module: the module name
+    :param path: the directory the module is imported from
+    :param n_runs: the number of interpreters started, the fastest import is kept
+    :return: a dict of the import time in seconds and whether matplotlib got imported
+    """
+    code = ('import sys, time, json, numpy\n'
+            f'sys.path.insert(0, {path!r})\n'
+            'start = time.perf_counter()\n'
+            f'import {module}\n'
+            'print(json.dumps([time.perf_counter() - start, "matplotlib" in sys.modules]))')
+    times, matplotlib = [], False
+    for _ in range(n_runs):
+        seconds, imported = json.loads(subprocess.run([sys.executable, '-c', code], check=True,
+                                                      capture_output=True, text=True).stdout)
+        times.append(seconds)
+        matplotlib |= imported
+    return {'import_s': min(times), 'matplotlib': matplotlib}
+
+
+def check_imports(budget: float) -> List[str]:
+    """
+    Checks that the modules of `IMPORTS` import within `budget` seconds and without matplotlib
+    :return: the list of the failures found
+    """
+    failures = []
+    for module, path in IMPORTS.items():
+        metrics = measure_import(module, path)
+        print(f'{"import/" + module:<48} {metrics["import_s"] * 1e3:9.1f} ms  matplotlib imported: '
+              f'{metrics["matplotlib"]}', flush=True)
+        if metrics['import_s'] > budget:
+            failures.append(f'import {module}: {metrics["import_s"]:.3f} s, budget {budget:.3f} s')
+        if metrics['matplotlib']:
+            failures.append(f'import {module}: matplotlib imported')
+    return failures
+
+
+def agree(system: FuzzySystem, inputs: List[Dict[str, float]]) -> List[str]:
+    """
+    Checks that `evaluate_output` and `evaluate_output_batch` give the same outputs
+    :return: the list of the samples where they differ
+    """
+    batch = system.evaluate_output_batch({name: [x[name] for x in inputs] for name in inputs[0]})
+    mismatches = []
+    for k, x in enumerate(inputs):
+        for name, value in system.evaluate_output(x).items():
+            if not np.isclose(value, batch[name][k], equal_nan=True):
+                mismatches.append(f'{x}: {name} {value} (evaluate_output), {batch[name][k]} (batch)')
+    return mismatches
+
+
+def check_consistency() -> List[str]:
+    """
+    Checks that the inference paths agree after the system is changed in place
+    :return: the list of the failures found
+    """
+    failures = []
+    system = build_fan_controller(parametric=True)
+    system.enable_cache()
+    inputs = random_inputs(system, 50)
+    system.evaluate_output_batch({name: [x[name] for x in inputs] for name in inputs[0]})
+    for x in inputs:
+        system.evaluate_output(x)
+    # moving breakpoints must invalidate the rule index and the cache
+    system.get_input_variable('Temperature').get_set('Hot').params = (10, 11, 40)
+    failures += [f'params changed: {mismatch}' for mismatch in agree(system, inputs)]
+    # so must the settings that change the outputs
+    for f_set in system.get_input_variable('Humidity').sets.values():
+        f_set.interpolate = True
+    failures += [f'interpolation changed: {mismatch}' for mismatch in agree(system, inputs)]
+    system.get_output_variable('Speed').defuzzifier = 'mom'
+    failures += [f'defuzzifier changed: {mismatch}' for mismatch in agree(system, inputs)]
+    system.get_output_variable('Speed').defuzzifier = 'cog'
+    for f_set in system.get_input_variable('Humidity').sets.values():
+        del f_set.interpolate
+    # the sampled consequent sets are cached by the output variable, compare with a system that never sampled them
+    system.get_output_variable('Speed').get_set('Fast').params = (40, 90, 100)
+    fresh = build_fan_controller(parametric=True)
+    fresh.get_input_variable('Temperature').get_set('Hot').params = (10, 11, 40)
+    fresh.get_output_variable('Speed').get_set('Fast').params = (40, 90, 100)
+    for x in inputs:
+        if not np.isclose(system.evaluate_output(x)['Speed'], fresh.evaluate_output(x)['Speed'], equal_nan=True):
+            failures.append(f'consequent params changed: {x} gives {system.evaluate_output(x)} '
+                            f'instead of {fresh.evaluate_output(x)}')
+
+    # a set added under a key other than its name must be looked up by the key
+    fan = build_fan_controller()
+    reference = [fan.evaluate_output(x) for x in inputs]
+    fan.get_input_variable('Humidity').add_set('Wet', FuzzySet.create_triangular('Damp', 20, 100, 100, 60, 100, 100))
+    fan.get_output_variable('Speed').add_set('Fast', FuzzySet.create_triangular('Quick', 0, 100, 100, 50, 100, 100))
+    system = FuzzySystem()
+    system.add_input_variable(fan.get_input_variable('Temperature'))
+    system.add_input_variable(fan.get_input_variable('Humidity'))
+    system.add_output_variable(fan.get_output_variable('Speed'))
+    for rule in fan.rules:
+        system.add_rule({clause.variable_name: clause.set_key for clause in rule.antecedents},
+                        {clause.variable_name: clause.set_key for clause in rule.consequents})
+    failures += [f'renamed sets: {mismatch}' for mismatch in agree(system, inputs)]
+    for x, expected in zip(inputs, reference):
+        if not np.isclose(system.evaluate_output(x)['Speed'], expected['Speed'], equal_nan=True):
+            failures.append(f'renamed sets: {x} gives {system.evaluate_output(x)} instead of {expected}')
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'fan.fis')
+        system.save(path)
+        loaded = FuzzySystem.load(path, mmap_mode=None)
+    for x in inputs:
+        if not np.isclose(loaded.evaluate_output(x)['Speed'], system.evaluate_output(x)['Speed'], equal_nan=True):
+            failures.append(f'renamed sets: {x} gives {loaded.evaluate_output(x)} once saved and loaded')
+    # the rules of `fan` follow the sets replaced under their keys
+    for x, expected in zip(inputs, reference):
+        if not np.isclose(fan.evaluate_output(x)['Speed'], expected['Speed'], equal_nan=True):
+            failures.append(f'replaced sets: {x} gives {fan.evaluate_output(x)} instead of {expected}')
+
+    # two edits must not cancel out in the signature of the cache and the rule index
+    system = build_fan_controller(parametric=True)
+    system.enable_cache()
+    for x in inputs:
+        system.evaluate_output(x)
+    temperature = system.get_input_variable('Temperature')
+    temperature.get_set('Hot').params = (25, 40, 40)
+    for x in inputs:
+        system.evaluate_output(x)
+    temperature.add_set('Hot', FuzzySet.create_triangular('Hot', 10, 40, 100, 30, 40, 40))
+    fresh = build_fan_controller(parametric=True)
+    fresh.get_input_variable('Temperature').add_set('Hot', FuzzySet.create_triangular('Hot', 10, 40, 100, 30, 40, 40))
+    for x in inputs:
+        if not np.isclose(system.evaluate_output(x)['Speed'], fresh.evaluate_output(x)['Speed'], equal_nan=True):
+            failures.append(f'set replaced: {x} gives {system.evaluate_output(x)} '
+                            f'instead of {fresh.evaluate_output(x)}')
+
+    # the control surface covers the TSK outputs, with or without Mamdani outputs
+    mamdani = build_fan_controller()
+    tsk = FuzzySystem()
+    tsk.add_input_variable(mamdani.get_input_variable('Temperature'))
+    tsk.add_input_variable(mamdani.get_input_variable('Humidity'))
+    for system in (mamdani, tsk):
+        for temperature, power in (('Cold', 0), ('Medium', (10, {'Temperature': 1})), ('Hot', (40, {'Humidity': 0.5}))):
+            system.add_tsk_rule({'Temperature': temperature}, {'Power': power})
+        surface = system.compile_surface({'Temperature': 61, 'Humidity': 161}, seed=0)
+        expected = list(system.output_variables) + ['Power']
+        if surface.output_names != expected:
+            failures.append(f'surface: outputs {surface.output_names} instead of {expected}')
+        elif not all(np.isfinite(error) and error < 5 for error in surface.max_error.values()):
+            failures.append(f'surface: interpolation errors {surface.max_error}')
+
+    # inputs of the same grid cell must not share a cache entry when the outputs depend on the exact inputs
+    variants = {'TSK': build_fan_controller(), 'parametric': build_fan_controller(parametric=True),
+                'interpolating': build_fan_controller()}
+    variants['TSK'].add_tsk_rule({'Temperature': 'Medium'}, {'Power': (10, {'Temperature': 1})})
+    for f_set in variants['interpolating'].get_input_variable('Temperature').sets.values():
+        f_set.interpolate = True
+    for variant, system in variants.items():
+        system.enable_cache()
+        system.evaluate_output({'Temperature': 17.9, 'Humidity': 55})
+        x = {'Temperature': 17.95, 'Humidity': 55}
+        cached = system.evaluate_output(x)
+        system.disable_cache()
+        exact = system.evaluate_output(x)
+        if not all(np.isclose(cached[name], exact[name], equal_nan=True) for name in exact):
+            failures.append(f'cache of {variant} inputs: {x} gives {cached} instead of {exact}')
+
+    for failure in failures:
+        print('CONSISTENCY', failure)
+    return failures
+
+
+def run(args: Any) -> Dict[str, Dict[str, float]]:
+    """
+    Runs every scenario
+    :return: a dict of the results, in the form {'scenario/benchmark': {metric: value, ...}, ...}
+    """
+    results = {}
+
+    def record(scenario: str, scenario_results: Dict[str, Dict[str, float]]) -> None:
+        for benchmark, metrics in scenario_results.items():
+            key = f'{scenario}/{benchmark}'
+            results[key] = metrics
+            print(f'{key:<48} p50 {metrics["p50_us"]:9.1f} us (spread {metrics["p50_spread"]:4.0%})  '
+                  f'p90 {metrics["p90_us"]:9.1f} us  '
+                  f'p99 {metrics["p99_us"]:9.1f} us  {metrics["calls_per_sec"]:10.0f} calls/s  '
+                  f'{metrics["bytes_per_call"]:9.0f} B/call', flush=True)
+
+    record('fan', benchmark_system(build_fan_controller(), args.calls, args.repeats))
+    for res in args.res:
+        record(f'sets-res{res}', benchmark_sets(res, args.calls, args.repeats))
+    for n_inputs, n_sets, n_rules, res in itertools.product(args.inputs, args.sets, args.rules, args.res):
+        system = build_synthetic(n_inputs, n_sets, n_rules, res)
+        record(f'in{n_inputs}-sets{n_sets}-rules{n_rules}-res{res}',
+               benchmark_system(system, args.calls, args.repeats))
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], tolerance: float) -> List[str]:
+    """
+    Compares the median latencies with a baseline, and warns about the benchmarks too noisy for the tolerance
+    :param tolerance: the allowed relative slowdown
+    :return: the list of the regressions found
+    """
+    regressions = []
+    for key, metrics in results.items():
+        if key not in baseline:
+            continue
+        # baselines saved before the runs were repeated have no spread
+        spread = max(metrics['p50_spread'], baseline[key].get('p50_spread', 0))
+        if spread > tolerance:
+            print('NOISY', f'{key}: the medians of the runs spread by {spread:.0%}, above the tolerance')
+        ratio = metrics['p50_us'] / baseline[key]['p50_us']
+        if ratio > 1 + tolerance:
+            regressions.append(f'{key}: p50 {metrics["p50_us"]:.1f} us, baseline {baseline[key]["p50_us"]:.1f} us '
+                               f'({ratio - 1:+.0%})')
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Benchmark suite of the fuzzy_system package')
+    parser.add_argument('--calls', type=int, default=500, help='timed calls per run of a benchmark')
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs per benchmark, the fastest median is kept')
+    parser.add_argument('--inputs', type=int, nargs='+', default=[1, 2, 4], help='numbers of input variables')
+    parser.add_argument('--sets', type=int, nargs='+', default=[3, 7], help='numbers of sets per variable')
+    parser.add_argument('--rules', type=int, nargs='+', default=[10, 100], help='numbers of rules')
+    parser.add_argument('--res', type=int, nargs='+', default=[101, 1001], help='resolutions of the variables')
+    parser.add_argument('--save', metavar='PATH', help='store the results as a baseline')
+    parser.add_argument('--compare', metavar='PATH', help='fail when slower than the baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown of the median')
+    parser.add_argument('--import-budget', type=float, default=0.5, help='allowed import time in seconds')
+    args = parser.parse_args()
+
+    failures = check_imports(args.import_budget)
+    for failure in failures:
+        print('IMPORT', failure)
+    # the consistency failures are printed by the check
+    failures += check_consistency()
+    results = run(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print('REGRESSION', regression)
+        if regressions:
+            return 1
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
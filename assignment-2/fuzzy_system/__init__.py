@@ -3,4 +3,10 @@ from .fuzzy_clause import FuzzyClause
 from .fuzzy_variable_input import FuzzyVariableInput
 from .fuzzy_variable_output import FuzzyVariableOutput
 from .fuzzy_rule import FuzzyRule
+from .fuzzy_rule_tsk import FuzzyRuleTSK
 from .fuzzy_system import FuzzySystem
+from .fuzzy_surface import FuzzySurface
+from .fuzzy_profiler import FuzzyProfiler
+from .fuzzy_stream import iter_array_chunks, read_csv_chunks, read_npy_chunks, prefetch
+from .fuzzy_server import FuzzyServer
+from .fuzzy_client import FuzzyClient
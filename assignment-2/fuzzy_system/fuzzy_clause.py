@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Any, Union
 from .fuzzy_set import FuzzySet
 from .fuzzy_variable import FuzzyVariable
 from .fuzzy_variable_input import FuzzyVariableInput
@@ -10,6 +10,8 @@ class FuzzyClause:
     A fuzzy clause of the type 'variable is fset' used in fuzzy IF ... THEN ... rules
     clauses can be antecedent (IF part) or consequent (THEN part)
     """
+    __slots__ = ('var', '_key', '_f_set')
+
     def __init__(self,
                  var: Union[FuzzyVariable, FuzzyVariableInput, FuzzyVariableOutput],
                  f_set: FuzzySet) -> None:
@@ -23,7 +25,9 @@ class FuzzyClause:
         if f_set.name == '':
             raise Exception(str(f_set), 'No set\'s name!')
         self.var = var
-        self.f_set = f_set
+        # the clause follows the key of its set, so that replacing the set with `add_set` rebinds the rules
+        self._key = next((key for key, s in var.sets.items() if s is f_set), None)
+        self._f_set = f_set     # used when the set is not one of the variable sets
 
     def __str__(self) -> str:
         """
@@ -40,6 +44,16 @@ class FuzzyClause:
         """
         return self.var.name
 
+    @property
+    def f_set(self) -> FuzzySet:
+        """
+        The fuzzy set in 'variable is fset', the one currently registered under the key of the set
+        the clause was created with
+        """
+        if self._key is None:
+            return self._f_set
+        return self.var.sets.get(self._key, self._f_set)
+
     @property
     def fset_name(self) -> str:
         """
@@ -48,18 +62,33 @@ class FuzzyClause:
         """
         return self.f_set.name
 
-    def evaluate_antecedent(self) -> float:
+    @property
+    def set_key(self) -> str:
+        """
+        Returns the key the set is registered under in the variable, to look the set up by;
+        it differs from `fset_name` when the set was added with `add_set(key, f_set)` under another name
+        :return: key of the set
+        """
+        if self._key is not None and self._key in self.var.sets:
+            return self._key
+        return self.var.set_key(self._f_set)
+
+    def evaluate_antecedent(self, context: Any = None) -> float:
         """
         Used when set is antecedent, it returns the set degree of membership.
+        :param context: the FuzzyContext of the inference, None uses the state stored in the set
         :return: the set degree of membership given a value for that variable.
-                    This value is determined at an earlier stage and stored in the set
+                    This value is determined at an earlier stage and stored in the set (or in the context)
         """
-        return self.f_set.last_dom_value
+        if context is None:
+            return self.f_set.last_dom_value
+        return context.get_dom(self.f_set)
 
-    def evaluate_consequent(self, dom: float) -> None:
+    def evaluate_consequent(self, dom: float, context: Any = None) -> None:
         """
         Used when clause is consequent.
+        The set resulting from min operation with the scalar value is merged into the output distribution in place
         :param dom: degree of membership, or scalar value from the antecedent clauses
-        :return: Fuzzy Set Type1, a set resulting from min operation with the scalar value
+        :param context: the FuzzyContext of the inference, None uses the output distribution of the variable
         """
-        self.var.add_rule_contribution(self.f_set.min_scalar(dom))
+        self.var.add_clipped_contribution(self.f_set, dom, context)
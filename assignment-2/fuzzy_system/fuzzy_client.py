@@ -0,0 +1,82 @@
+import asyncio
+import json
+from typing import Any, Dict
+
+
+class FuzzyClient:
+    """
+    An asyncio client of FuzzyServer. Requests can be awaited concurrently over the same connection
+    """
+
+    def __init__(self) -> None:
+        self._reader = None
+        self._writer = None
+        self._listener = None
+        self._pending = {}  # the futures of the requests waiting for their response, {id: future, ...}
+        self._next_id = 0
+
+    async def connect(self, host: str = '127.0.0.1', port: int = None, path: str = None) -> Any:
+        """
+        Connects to a server, by TCP or by Unix socket
+        :param host: the TCP host
+        :param port: the TCP port
+        :param path: the path of a Unix socket, used instead of TCP when given
+        :return: the client
+        """
+        if path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(path)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(host, port)
+        self._listener = asyncio.ensure_future(self._listen())
+        return self
+
+    async def close(self) -> None:
+        self._writer.close()
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+
+    async def evaluate(self, input_values: Dict[str, float]) -> Dict[str, float]:
+        """
+        Evaluates one sample on the server
+        :param input_values: a dict containing the inputs in the form {input_variable_name: value, ...}
+        :return: a dict containing the outputs in the form {output_variable_name: value, ...}
+        """
+        outputs = (await self._request({'inputs': input_values}))['outputs']
+        # the server sends the outputs that are not finite numbers as null
+        return {name: float('nan') if value is None else value for name, value in outputs.items()}
+
+    async def metrics(self) -> Dict[str, Any]:
+        """
+        :return: the metrics of the server, see `FuzzyServer.metrics`
+        """
+        return (await self._request({'command': 'metrics'}))['metrics']
+
+    async def _request(self, request: dict) -> dict:
+        request_id = self._next_id
+        self._next_id += 1
+        future = self._pending[request_id] = asyncio.get_running_loop().create_future()
+        self._writer.write(json.dumps(dict(request, id=request_id)).encode() + b'\n')
+        response = await future
+        if 'error' in response:
+            raise Exception(response['error'])
+        return response
+
+    async def _listen(self) -> None:
+        # dispatch the responses, which can come back in any order, to the waiting requests
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                response = json.loads(line)
+                future = self._pending.pop(response['id'], None)
+                if future is not None and not future.done():
+                    future.set_result(response)
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(ConnectionError('Connection to the server closed!'))
+            self._pending.clear()
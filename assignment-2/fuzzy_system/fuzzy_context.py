@@ -0,0 +1,69 @@
+from typing import Any, Tuple
+from numpy.typing import NDArray
+import numpy as np
+from .fuzzy_set import FuzzySet
+
+
+class FuzzyContext:
+    """
+    The state of an inference, kept apart from the model definition:
+    the degrees of membership of the input sets and the output distributions.
+    A FuzzySystem can be evaluated concurrently as long as every thread uses its own context
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes an empty context, the output buffers are allocated the first time a variable is aggregated
+        data structures:
+            doms -- dict holding the degree of membership of the fuzzified sets, {FuzzySet: float, ...}
+            output_buffers -- dict holding the output distribution and a scratch buffer of each output variable,
+                              {FuzzyVariableOutput: (FuzzySet, array), ...}
+            heights -- dict holding the clipping height of each fired consequent set of each output variable,
+                       {FuzzyVariableOutput: {FuzzySet: float, ...}, ...}
+        """
+        self.doms = {}
+        self.output_buffers = {}
+        self.heights = {}
+        self.incremental_state = None   # used by FuzzySystem.evaluate_output_incremental
+
+    def set_dom(self, f_set: FuzzySet, dom: float) -> None:
+        """
+        Stores the degree of membership of a fuzzified set
+        :param f_set: the input fuzzy set
+        :param dom: the degree of membership
+        """
+        self.doms[f_set] = dom
+
+    def get_dom(self, f_set: FuzzySet) -> float:
+        """
+        The degree of membership of a set, falls back to `f_set.last_dom_value` if it was not fuzzified in this context
+        :param f_set: the input fuzzy set
+        :return: the degree of membership
+        """
+        dom = self.doms.get(f_set)
+        return f_set.last_dom_value if dom is None else dom
+
+    def get_output_buffers(self, var: Any) -> Tuple[FuzzySet, NDArray]:
+        """
+        The output distribution of an output variable and its scratch buffer, allocated once per context
+        :param var: the output variable
+        :return: the output distribution and the scratch buffer for a clipped consequent
+        """
+        buffers = self.output_buffers.get(var)
+        # allocated again when the variable was moved onto another domain
+        if buffers is None or buffers[0].domain is not var.output_distribution.domain:
+            distribution = var.output_distribution.min_scalar(0)
+            distribution.name = var.name
+            buffers = self.output_buffers[var] = (distribution, np.zeros(distribution.dom.shape))
+        return buffers
+
+    def get_heights(self, var: Any) -> dict:
+        """
+        The clipping height of each fired consequent set of an output variable
+        :param var: the output variable
+        :return: a dict having the form {FuzzySet: height, ...}
+        """
+        heights = self.heights.get(var)
+        if heights is None:
+            heights = self.heights[var] = {}
+        return heights
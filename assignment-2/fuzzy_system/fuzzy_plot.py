@@ -0,0 +1,53 @@
+"""
+Plotting of fuzzy sets, variables and systems.
+This module is only imported by the `plot_*` methods, so that importing the package does not import matplotlib
+"""
+from typing import Any
+import matplotlib.pyplot as plt
+
+
+def plot_set(f_set: Any, ax: Any, col: str = '') -> None:
+    """
+    Visualize the fuzzy set
+    """
+    ax.plot(f_set.domain, f_set.dom, col)
+    ax.set_ylim([-0.1, 1.1])
+    ax.set_title(f_set.name)
+    ax.grid(True, which='both', alpha=0.4)
+    ax.set(xlabel='x', ylabel='$\\mu(x)$')
+
+
+def plot_variable(var: Any, ax: Any = None, show: bool = True) -> None:
+    """
+    Plots a graphical representation of the fuzzy variable
+    Reference:
+    ----------
+        https://stackoverflow.com/questions/4700614/how-to-put-the-legend-out-of-the-plot
+    """
+    if ax is None:
+        ax = plt.subplot(111)
+    for n, s in var.sets.items():
+        ax.plot(s.get_domain_elements(), s.get_dom_elements(), label=n)
+    # Shrink current axis by 20%
+    pos = ax.get_position()
+    ax.set_position([pos.x0, pos.y0, pos.width * 0.8, pos.height])
+    ax.grid(True, which='both', alpha=0.4)
+    ax.set_title(var.name)
+    ax.set(xlabel='x', ylabel='$\\mu (x)$')
+    # Put a legend to the right of the current axis
+    ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+    if show:
+        plt.show()
+
+
+def plot_system(system: Any) -> None:
+    total_var_count = len(system.input_variables) + len(system.output_variables)
+    if total_var_count < 2:
+        total_var_count = 2
+    fig, axs = plt.subplots(total_var_count, 1)
+    fig.tight_layout(pad=1.0)
+    for idx, var_name in enumerate(system.input_variables):
+        system.input_variables[var_name].plot_variable(ax=axs[idx], show=False)
+    for idx, var_name in enumerate(system.output_variables):
+        system.output_variables[var_name].plot_variable(ax=axs[len(system.input_variables) + idx], show=False)
+    plt.show()
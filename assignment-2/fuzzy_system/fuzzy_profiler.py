@@ -0,0 +1,145 @@
+import threading
+from time import perf_counter
+from typing import Any, Dict, List, Tuple
+from numpy.typing import NDArray
+import numpy as np
+
+STAGES = ('fuzzify', 'rules', 'aggregation', 'defuzzify', 'tsk')
+
+
+class FuzzyProfiler:
+    """
+    Instrumentation of `FuzzySystem.evaluate_output`: the time spent and the number of calls of each inference stage
+    (fuzzification, rule firing, aggregation of the consequents, defuzzification and TSK rules),
+    the number of evaluations and cache hits, and the fire count and strengths of each rule.
+    A system only calls its profiler when one is attached, see `FuzzySystem.enable_profiling` and
+    `FuzzySystem.profile`, so a system without profiler pays a single attribute check per evaluation
+    """
+
+    def __init__(self) -> None:
+        """
+        Initializes the profiler
+        data structures:
+            timings -- dict holding the total time spent in each stage in seconds, {stage: float, ...}
+            counts -- dict holding the number of times each stage ran, {stage: int, ...}
+            evaluations, cache_hits -- the number of evaluations and of evaluations answered by the cache
+            rule_evaluations -- array, number of times each rule was evaluated (its antecedent sets were active)
+            rule_fires -- array, number of times each rule fired with a nonzero strength
+            rule_strength_sum, rule_strength_max -- arrays, the sum and the maximum of the strengths of each rule
+        """
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clears all the timers and counters
+        """
+        with self._lock:
+            self.timings = dict.fromkeys(STAGES, 0.)
+            self.counts = dict.fromkeys(STAGES, 0)
+            self.evaluations = 0
+            self.cache_hits = 0
+            self.rule_evaluations = np.zeros(0, dtype=np.int64)
+            self.rule_fires = np.zeros(0, dtype=np.int64)
+            self.rule_strength_sum = np.zeros(0)
+            self.rule_strength_max = np.zeros(0)
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        """
+        Accounts the time spent in a stage
+        :param stage: the stage name, one of `STAGES`
+        :param seconds: the elapsed time
+        """
+        with self._lock:
+            self.timings[stage] += seconds
+            self.counts[stage] += 1
+
+    def add_evaluation(self, cache_hit: bool = False) -> None:
+        """
+        Counts an evaluation of the system
+        :param cache_hit: True if the outputs came from the cache
+        """
+        with self._lock:
+            self.evaluations += 1
+            self.cache_hits += cache_hit
+
+    def fire_rules(self, rules: List[Any], rule_indices: NDArray, context: Any) -> None:
+        """
+        Evaluates the rules like `FuzzyRule.evaluate`, timing the strength computation and the aggregation
+        of the consequents separately, and recording the strength of every rule
+        :param rules: the rules of the system
+        :param rule_indices: the indices of the rules to evaluate
+        :param context: the FuzzyContext of the inference
+        """
+        clock = perf_counter
+        strengths = np.empty(len(rule_indices))
+        rule_time = aggregation_time = 0.
+        for k, r in enumerate(rule_indices):
+            rule = rules[r]
+            start = clock()
+            strength = strengths[k] = rule.evaluate_strength(context)
+            middle = clock()
+            for consequent_clause in rule.consequents:
+                consequent_clause.evaluate_consequent(strength, context)
+            rule_time += middle - start
+            aggregation_time += clock() - middle
+        with self._lock:
+            self.timings['rules'] += rule_time
+            self.counts['rules'] += 1
+            self.timings['aggregation'] += aggregation_time
+            self.counts['aggregation'] += 1
+            if len(rules) > len(self.rule_fires):
+                self._grow(len(rules))
+            self.rule_evaluations[rule_indices] += 1
+            self.rule_fires[rule_indices] += strengths > 0
+            self.rule_strength_sum[rule_indices] += strengths
+            np.maximum.at(self.rule_strength_max, rule_indices, strengths)
+
+    def _grow(self, n_rules: int) -> None:
+        # rules were added to the system, extend the per-rule counters
+        extra = n_rules - len(self.rule_fires)
+        self.rule_evaluations = np.concatenate([self.rule_evaluations, np.zeros(extra, dtype=np.int64)])
+        self.rule_fires = np.concatenate([self.rule_fires, np.zeros(extra, dtype=np.int64)])
+        self.rule_strength_sum = np.concatenate([self.rule_strength_sum, np.zeros(extra)])
+        self.rule_strength_max = np.concatenate([self.rule_strength_max, np.zeros(extra)])
+
+    def hot_rules(self, n: int = 10) -> List[Tuple[int, int, float, float]]:
+        """
+        The rules that fired the most
+        :param n: the number of rules
+        :return: a list of (rule index, fire count, mean strength when fired, max strength), most fired first
+        """
+        order = np.argsort(-self.rule_fires, kind='stable')[:n]
+        return [(int(r), int(self.rule_fires[r]),
+                 float(self.rule_strength_sum[r] / self.rule_fires[r]) if self.rule_fires[r] else 0.,
+                 float(self.rule_strength_max[r])) for r in order]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        The counters as plain values
+        :return: a dict of the form {'evaluations': int, 'cache_hits': int,
+                 'stages': {stage: {'calls': int, 'total': seconds, 'mean': seconds}, ...}}
+        """
+        stages = {stage: {'calls': self.counts[stage],
+                          'total': self.timings[stage],
+                          'mean': self.timings[stage] / self.counts[stage] if self.counts[stage] else 0.}
+                  for stage in STAGES}
+        return {'evaluations': self.evaluations, 'cache_hits': self.cache_hits, 'stages': stages}
+
+    def report(self, system: Any = None, n_rules: int = 10) -> str:
+        """
+        A readable report of the stages and of the hot rules
+        :param system: the profiled FuzzySystem, used to print the rules, None prints their indices only
+        :param n_rules: the number of hot rules to list
+        :return: the report
+        """
+        lines = [f'{self.evaluations} evaluations, {self.cache_hits} cache hits']
+        for stage, stats in self.summary()['stages'].items():
+            if stats['calls']:
+                lines.append(f'{stage:<12} {stats["calls"]:>10} calls {stats["total"] * 1e3:12.3f} ms '
+                             f'{stats["mean"] * 1e6:10.2f} us/call')
+        for r, fires, mean, peak in self.hot_rules(n_rules):
+            if fires:
+                rule = f'{system.rules[r]}' if system is not None else ''
+                lines.append(f'rule {r:<5} fired {fires:>8} times, mean strength {mean:.3f}, max {peak:.3f} {rule}')
+        return '\n'.join(lines)
@@ -9,6 +9,7 @@ class FuzzyRule:
     A fuzzy rule of type
     IF [antecedent clauses] THEN [consequent clauses]
     """
+    __slots__ = ('antecedents', 'consequents')
 
     def __init__(self) -> None:
         """
@@ -31,64 +32,73 @@ class FuzzyRule:
 
     def add_antecedent_clause(self, var: FuzzyVariable, f_set: FuzzySet) -> None:
         """
-        TODO:
-         Creat new antecedent clause using FuzzyClause from `var` and `f_set`
-         Then add the created antecedent clause to `self.antecendents`
+        Creat new antecedent clause using FuzzyClause from `var` and `f_set`
+        Then add the created antecedent clause to `self.antecendents`
         :param var: the clause variable in 'variable is set'
         :param f_set: another fuzzy set
         """
-        clause = None
-        # Write your code below
-
-        pass
+        clause = FuzzyClause(var, f_set)
+        self.antecedents.append(clause)
 
     def add_consequent_clause(self, var: FuzzyVariable, f_set: FuzzySet) -> None:
         """
-        TODO:
-         Creat new consequent clause using FuzzyClause from `var` and `f_set`
-         Then add the created consequent clause to `self.consequents`
+        Creat new consequent clause using FuzzyClause from `var` and `f_set`
+        Then add the created consequent clause to `self.consequents`
         Adds a consequent clause to the rule
         :param var: the clause variable in 'variable is set'
         :param f_set: another fuzzy set
         """
-        clause = None
-        # Write your code below
+        clause = FuzzyClause(var, f_set)
+        self.consequents.append(clause)
 
-        pass
+    def add_clauses(self, antecedents: list, consequents: list) -> None:
+        """
+        Adds existing clauses to the rule. Clauses are never modified, so the same clause can be shared by many rules
+        :param antecedents: list of FuzzyClause, the antecedent clauses
+        :param consequents: list of FuzzyClause, the consequent clauses
+        """
+        self.antecedents.extend(antecedents)
+        self.consequents.extend(consequents)
 
-    def evaluate(self) -> None:
+    def evaluate_strength(self, context: Any = None) -> float:
         """
-        Evaluation of the rule.
-        The antecedent clauses are executed and the minimum degree of membership is retained.
-        This is used in the consequent clauses to min with the consequent set
-        The values are returned in a dict of the form {variable_name: scalar min set, ...}
-        :return: a dict resulting sets in the form {variable_name: scalar min set, ...}
+        Evaluation of the antecedent clauses only.
+        :param context: the FuzzyContext of the inference, None uses the state stored in the sets
+        :return: the rule strength, the minimum degree of membership of the antecedent clauses
         """
         # rule dom initialize to 1 as min operator will be performed
         rule_strength = 1
         # execute all antecedent clauses, keeping the minimum of the
         # returned doms to determine the rule strength
         for ante_clause in self.antecedents:
-            rule_strength = min(ante_clause.evaluate_antecedent(), rule_strength)
+            rule_strength = min(ante_clause.evaluate_antecedent(context), rule_strength)
+        return rule_strength
+
+    def evaluate(self, context: Any = None) -> None:
+        """
+        Evaluation of the rule.
+        The antecedent clauses are executed and the minimum degree of membership is retained.
+        This is used in the consequent clauses to min with the consequent set
+        The values are returned in a dict of the form {variable_name: scalar min set, ...}
+        :param context: the FuzzyContext of the inference, None uses the state stored in the variables
+        :return: a dict resulting sets in the form {variable_name: scalar min set, ...}
+        """
+        rule_strength = self.evaluate_strength(context)
         # execute consequent clauses, each output variable will update its output_distribution set
         for consequent_clause in self.consequents:
-            consequent_clause.evaluate_consequent(rule_strength)
+            consequent_clause.evaluate_consequent(rule_strength, context)
 
-    def evaluate_info(self) -> str:
+    def evaluate_info(self, context: Any = None) -> str:
         """
         Evaluation of the rule.
         The antecedent clauses are executed and the minimum degree of membership is retained.
         This is used in teh consequent clauses to min with the consequent set
         The values are returned in a dict of the form {variable_name: scalar min set, ...}
+        :param context: the FuzzyContext of the inference, None uses the state stored in the variables
         :return:  a dict that resulting sets in the form {variable_name: scalar min set, ...}
         """
-        # rule dom initialize to 1 as min operator will be performed
-        rule_strength = 1
-        # execute all antecedent clauses, keeping the minimum of the
-        # returned doms to determine the rule strength
-        for ante_clause in self.antecedents:
-            rule_strength = min(ante_clause.evaluate_antecedent(), rule_strength)
+        rule_strength = self.evaluate_strength(context)
         # execute consequent clauses, each output variable will update its output_distribution set
         for consequent_clause in self.consequents:
-            consequent_clause.evaluate_consequent(rule_strength)
+            consequent_clause.evaluate_consequent(rule_strength, context)
         return f'{rule_strength} : {self}'
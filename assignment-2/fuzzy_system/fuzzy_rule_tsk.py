@@ -0,0 +1,66 @@
+from typing import Any, Dict
+from .fuzzy_rule import FuzzyRule
+
+
+class FuzzyRuleTSK(FuzzyRule):
+    """
+    A Takagi-Sugeno-Kang fuzzy rule of type
+    IF [antecedent clauses] THEN [output = c0 + c1 * x1 + ... + cn * xn, ...]
+    The antecedent clauses are the same as in a Mamdani rule, the consequents are crisp linear functions
+    of the inputs, a zero-order rule only has the constant c0
+    Reference:
+    ----------
+    Takagi, Tomohiro, and Michio Sugeno.
+    "Fuzzy identification of systems and its applications to modeling and control."
+    IEEE Transactions on Systems, Man, and Cybernetics 1 (1985): 116-132.
+    """
+    __slots__ = ()
+
+    def __init__(self) -> None:
+        """
+        Initializes the fuzzy rule
+        The consequents are kept as a dict of the form {output_name: (constant, {input_name: coefficient, ...}), ...}
+        """
+        super().__init__()
+        self.consequents = {}   # dict of consequent functions
+
+    def __str__(self) -> str:
+        """
+        String representation of the rule
+        :return: string representation of the rule in the form IF [antecedent clauses] THEN [output = function]
+        """
+        ante = ' and '.join(map(str, self.antecedents))
+        cons = []
+        for output_name, (constant, coefficients) in self.consequents.items():
+            terms = [str(constant)] + [f'{c} * {name}' for name, c in coefficients.items()]
+            cons.append(f'{output_name} = {" + ".join(terms)}')
+        return f'IF {ante} THEN {" and ".join(cons)}'
+
+    def add_consequent_function(self, output_name: str, constant: float, coefficients: Dict[str, float] = None) -> None:
+        """
+        Adds a consequent function to the rule
+        :param output_name: the name of the output
+        :param constant: the constant term c0
+        :param coefficients: the coefficients of the inputs, in the form {input_name: coefficient, ...}
+        """
+        self.consequents[output_name] = (constant, dict(coefficients or {}))
+
+    def evaluate_consequents(self, input_values: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Evaluates the consequent functions of the rule. Works on scalars as well as on arrays of inputs
+        :param input_values: a dict containing the crisp inputs in the form {input_variable_name: value, ...}
+        :return: a dict containing the rule outputs in the form {output_name: value, ...}
+        """
+        output = {}
+        for output_name, (constant, coefficients) in self.consequents.items():
+            value = constant
+            for input_name, c in coefficients.items():
+                value = value + c * input_values[input_name]
+            output[output_name] = value
+        return output
+
+    def evaluate(self, context: Any = None) -> None:
+        raise Exception('A TSK rule has no consequent sets, use evaluate_strength and evaluate_consequents!')
+
+    def evaluate_info(self, context: Any = None) -> str:
+        raise Exception('A TSK rule has no consequent sets, use evaluate_strength and evaluate_consequents!')
@@ -0,0 +1,235 @@
+import asyncio
+import json
+import math
+import time
+from numbers import Real
+from typing import Any, Dict, List
+import numpy as np
+
+
+class FuzzyServer:
+    """
+    An asyncio inference server around a FuzzySystem.
+    Concurrent single-sample requests are coalesced into micro-batches: a batch is evaluated by
+    `FuzzySystem.evaluate_output_batch` once it holds `max_batch_size` requests, or `max_latency` seconds after
+    its first request arrived, whichever comes first.
+    The server listens on a local TCP port or a Unix socket and speaks newline-delimited JSON:
+        request  {"id": 1, "inputs": {"Temperature": 18, "Humidity": 60}}
+        response {"id": 1, "outputs": {"Speed": 37.2}}     or {"id": 1, "error": "..."}
+        request  {"id": 2, "command": "metrics"}
+        response {"id": 2, "metrics": {...}}
+    The responses are standard JSON: an output that is not a finite number, e.g. NaN when no rule fires,
+    is sent as null
+    """
+
+    def __init__(self, system: Any, max_batch_size: int = 256, max_latency: float = 0.002) -> None:
+        """
+        Creates the server, `start` opens the socket
+        :param system: the FuzzySystem to serve, it must not be modified while the server runs
+        :param max_batch_size: the maximum number of requests evaluated together
+        :param max_latency: the maximum time in seconds a request waits for its batch to fill up
+        """
+        self.system = system
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        self._connections = set()
+        # metrics
+        self.requests = 0
+        self.batches = 0
+        self.max_queue_depth = 0
+        self.batch_sizes = {}   # histogram of the batch sizes, {size: count, ...}
+        self.total_latency = 0.     # sum of the request latencies, from arrival to result, in seconds
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0, path: str = None) -> Any:
+        """
+        Opens the socket and starts the batching task
+        :param host: the TCP host
+        :param port: the TCP port, 0 picks a free port
+        :param path: the path of a Unix socket, used instead of TCP when given
+        :return: the address the server listens on, (host, port) or the socket path
+        """
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.ensure_future(self._run_batches())
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle_connection, path=path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host=host, port=port)
+        return self.address
+
+    @property
+    def address(self) -> Any:
+        """
+        The address the server listens on, (host, port) or the Unix socket path
+        """
+        address = self._server.sockets[0].getsockname()
+        return address if isinstance(address, str) else address[:2]
+
+    async def serve_forever(self) -> None:
+        await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Closes the socket and the open connections, and stops the batching task
+        """
+        self._server.close()
+        for writer in list(self._connections):
+            writer.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        try:
+            await self._batcher
+        except asyncio.CancelledError:
+            pass
+
+    async def evaluate(self, input_values: Dict[str, float]) -> Dict[str, float]:
+        """
+        Evaluates one sample within the next micro-batch, can also be awaited directly without a socket
+        :param input_values: a dict containing the inputs in the form {input_variable_name: value, ...}
+        :return: a dict containing the outputs in the form {output_variable_name: value, ...}
+        """
+        # a bad sample is rejected here, so that it cannot fail the batch shared with other requests
+        self._check_sample(input_values)
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((input_values, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        :return: a dict with the queue depth, the batch-size histogram and the mean batch size and latency
+        """
+        return {'queue_depth': 0 if self._queue is None else self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': self.requests / self.batches if self.batches else 0.,
+                'batch_sizes': dict(sorted(self.batch_sizes.items())),
+                'mean_latency': self.total_latency / self.requests if self.requests else 0.}
+
+    async def _run_batches(self) -> None:
+        """
+        Collects the queued requests into batches and evaluates them, one batch at a time.
+        The requests arriving while a batch is evaluated are queued for the next one
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                if self._queue.empty():
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self._queue.get_nowait())
+            # the numerical work runs on a worker thread, the event loop keeps accepting requests
+            results = await loop.run_in_executor(None, self._evaluate_batch, [item[0] for item in batch])
+            now = time.perf_counter()
+            for (_, future, arrival), result in zip(batch, results):
+                if not future.done():
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+                self.total_latency += now - arrival
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    def _check_sample(self, input_values: Any) -> None:
+        """
+        Raises an exception unless the sample maps input variables of the system to finite numbers
+        """
+        if not isinstance(input_values, dict):
+            raise Exception('The inputs must be an object of the form {input_variable_name: value, ...}!')
+        for name, value in input_values.items():
+            if name not in self.system.input_variables:
+                raise Exception(f'{name}: unknown input variable!')
+            if isinstance(value, bool) or not isinstance(value, Real) or not math.isfinite(value):
+                raise Exception(f'{name}: {value!r} is not a finite number!')
+
+    def _evaluate_batch(self, samples: List[Dict[str, float]]) -> List[Any]:
+        """
+        Evaluates a batch of samples, the samples are grouped by the set of inputs they provide
+        :param samples: the input dicts
+        :return: the output dict, or the exception raised, of each sample
+        """
+        groups = {}
+        for k, sample in enumerate(samples):
+            groups.setdefault(tuple(sample), []).append(k)
+        results = [None] * len(samples)
+        for names, indices in groups.items():
+            try:
+                inputs = {name: np.array([samples[k][name] for k in indices], dtype=float) for name in names}
+                outputs = self.system.evaluate_output_batch(inputs)
+                for j, k in enumerate(indices):
+                    results[k] = {name: float(values[j]) for name, values in outputs.items()}
+            except Exception as e:
+                if len(indices) == 1:
+                    results[indices[0]] = e
+                    continue
+                # evaluate the samples one by one, so that an error only fails the request it comes from
+                for k in indices:
+                    results[k] = self._evaluate_batch([samples[k]])[0]
+        return results
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Serves the requests of a client connection. Requests are answered as soon as their result is ready,
+        a client can send many requests without waiting for the responses
+        """
+        self._connections.add(writer)
+        pending = set()
+        # one response is written and drained at a time
+        write_lock = asyncio.Lock()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.ensure_future(self._answer(line, writer, write_lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.wait(pending)
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    async def _answer(self, line: bytes, writer: asyncio.StreamWriter, write_lock: asyncio.Lock) -> None:
+        """
+        Answers one request, waiting for the client to read the responses sent before when its buffer is full
+        """
+        response = {}
+        try:
+            request = json.loads(line)
+            response['id'] = request.get('id')
+            if request.get('command') == 'metrics':
+                response['metrics'] = self.metrics()
+            else:
+                outputs = await self.evaluate(request['inputs'])
+                response['outputs'] = {name: value if np.isfinite(value) else None for name, value in outputs.items()}
+        except Exception as e:
+            response['error'] = f'{type(e).__name__}: {e}'
+        try:
+            data = json.dumps(response, allow_nan=False).encode()
+        except ValueError as e:
+            data = json.dumps({'id': response.get('id'), 'error': f'{type(e).__name__}: {e}'}).encode()
+        async with write_lock:
+            if writer.is_closing():
+                return
+            writer.write(data + b'\n')
+            try:
+                await writer.drain()
+            except ConnectionError:
+                pass
+
@@ -1,35 +1,128 @@
+from functools import lru_cache
+from itertools import count
 from typing import Any
 from numpy.typing import NDArray
 import numpy as np
 
+# the versions of the sets, variables and systems are drawn from one counter: every change hands out a version
+# greater than all the existing ones, so the maximum of the versions of a system changes with any edit
+_versions = count(1)
+
+
+def next_version() -> int:
+    """
+    A version number greater than every version handed out before
+    """
+    return next(_versions)
+
+
+@lru_cache(maxsize=1024)
+def shared_domain(domain_min: float, domain_max: float, res: int) -> NDArray:
+    """
+    The read-only domain array of the given bounds and resolution, allocated once and shared by reference
+    by all the sets (and all their temporaries) of the same universe
+    :param domain_min: the minimum of the domain
+    :param domain_max: the maximum of the domain
+    :param res: the number of domain values
+    :return: the evenly spaced domain values
+    """
+    domain = np.linspace(domain_min, domain_max, res)
+    domain.flags.writeable = False
+    return domain
+
+
+def as_domain(domain: Any) -> NDArray:
+    """
+    A read-only array of increasing domain values, the array itself if it already is one
+    :param domain: the domain values
+    :return: the domain array
+    """
+    if isinstance(domain, np.ndarray) and domain.dtype == float and not domain.flags.writeable:
+        return domain
+    domain = np.array(domain, dtype=float)
+    if domain.ndim != 1 or len(domain) < 2 or np.any(np.diff(domain) <= 0):
+        raise Exception('The domain values must be increasing!')
+    domain.flags.writeable = False
+    return domain
+
+
+# the integration weights of the non-uniform domains, {id(domain): (domain, areas, moments), ...}
+_weights = {}
+
+
+def cell_weights(domain: NDArray) -> Any:
+    """
+    Integration weights of a (non-uniform) domain: for a membership function linear between the domain values,
+    its area is `dom @ areas` and its first moment `dom @ moments`, so its centroid is exact whatever the spacing
+    :param domain: the increasing domain values
+    :return: the arrays (areas, moments)
+    """
+    entry = _weights.get(id(domain))
+    if entry is None or entry[0] is not domain:
+        h = np.diff(domain)
+        areas = np.zeros(len(domain))
+        areas[:-1] += h / 2
+        areas[1:] += h / 2
+        moments = np.zeros(len(domain))
+        moments[:-1] += h * (2 * domain[:-1] + domain[1:]) / 6
+        moments[1:] += h * (domain[:-1] + 2 * domain[1:]) / 6
+        if len(_weights) >= 1024:
+            _weights.clear()
+        entry = _weights[id(domain)] = (domain, areas, moments)
+    return entry[1], entry[2]
+
 
 class FuzzySet:
     precision: int = 3
+    interpolate: bool = False   # interpolate linearly between the domain values instead of snapping to the nearest
 
-    def __init__(self, name: str, domain_min: float, domain_max: float, res: int) -> None:
+    def __init__(self, name: str, domain_min: float, domain_max: float, res: int, parametric: bool = False,
+                 domain: NDArray = None) -> None:
         """
         Initialize the fuzzy set
         :param name: name of the set
         :param domain_min: the minimum of the set
         :param domain_max: the maximum of the set
         :param res: the number of steps between the minimum and maximum value
+        :param parametric: if True, no degree-of-membership array is allocated,
+                           the membership is evaluated from the breakpoints in `self.params`
+        :param domain: increasing domain values to use instead of `res` evenly spaced ones, e.g. a grid
+                       concentrated around the breakpoints of the sets; it then sets `domain_min`, `domain_max` and `res`
         """
+        if domain is not None:
+            domain = as_domain(domain)
+            domain_min, domain_max, res = domain[0], domain[-1], len(domain)
         self.domain_min = domain_min    # the minimum value of the value domain
         self.domain_max = domain_max    # the maximum value of the value domain
         self.res = res
-        # initialize the domain values
-        self.domain = np.linspace(domain_min, domain_max, res)  # a list that contains discrete value in the value domain
-        # initialize the degree-of-membership values
-        self.dom = np.zeros(self.domain.shape)  # a list that contains degree of membership values estimated from self.domain
+        self.shape = None   # the membership function type, 'triangular' or 'trapezoidal', if known
+        self._params = None     # the breakpoints of the membership function, if known
+        # the discrete values of the value domain, shared with the other sets of the same universe
+        self._uniform = domain is None
+        self._domain = shared_domain(domain_min, domain_max, res) if domain is None else domain
+        if parametric:
+            self._dom = None
+        else:
+            # initialize the degree-of-membership values
+            self._dom = np.zeros(self._domain.shape)  # a list that contains degree of membership values estimated from self.domain
         #
         self.name = name
         self._last_dom_value = 0
+        self.version = next_version()   # renewed whenever the membership function changes
 
     def __getitem__(self, x_val: float):
-        return self.dom[np.abs(self.domain - x_val).argmin()]
+        if self.parametric:
+            return self.membership(x_val)
+        if self.interpolate:
+            return np.interp(x_val, self.domain, self.dom)
+        return self.dom[self.domain_index(x_val)]
 
     def __setitem__(self, x_val: float, dom: float):
-        self.dom[np.abs(self.domain - x_val).argmin()] = round(dom, self.precision)
+        if self.parametric:
+            # editing a single point turns the set into a sampled one
+            self.dom = self.dom
+        self.dom[self.domain_index(x_val)] = round(dom, self.precision)
+        self.version = next_version()
 
     def __str__(self) -> str:
         """
@@ -45,6 +138,72 @@ class FuzzySet:
 
     last_dom_value = property(__get_last_dom_value, __set_last_dom_value)
 
+    @property
+    def domain(self) -> NDArray:
+        """
+        The discrete values of the value domain, a read-only array
+        """
+        return self._domain
+
+    @property
+    def dom(self) -> NDArray:
+        """
+        The degree-of-membership values over `self.domain`. A parametric set samples them on request
+        """
+        if self._dom is None:
+            return self.membership(self.domain)
+        return self._dom
+
+    @dom.setter
+    def dom(self, dom: NDArray) -> None:
+        self._dom = dom
+        self.version = next_version()
+
+    @property
+    def params(self) -> Any:
+        """
+        The breakpoints of the membership function, (a, m, b) or (a, b, c, d), None if not known
+        """
+        return self._params
+
+    @params.setter
+    def params(self, params: Any) -> None:
+        self._params = params
+        self.version = next_version()
+
+    @property
+    def uniform(self) -> bool:
+        """
+        True when the domain values are evenly spaced between `domain_min` and `domain_max`
+        """
+        return self._uniform
+
+    def resample(self, domain: NDArray) -> None:
+        """
+        Moves the set onto another domain. The membership is evaluated again from the breakpoints if the set has any,
+        and interpolated linearly from the current domain otherwise
+        :param domain: the new increasing domain values
+        """
+        domain = as_domain(domain)
+        if not self.parametric:
+            if self.shape is not None:
+                dom = np.round(self.membership(domain), self.precision)
+            else:
+                dom = np.interp(domain, self.domain, self.dom)
+        self.domain_min, self.domain_max, self.res = domain[0], domain[-1], len(domain)
+        self._domain = domain
+        self._uniform = False
+        if not self.parametric:
+            self._dom = dom
+        self.version = next_version()
+
+    @property
+    def parametric(self) -> bool:
+        """
+        True when the set keeps only its breakpoints and evaluates the membership in closed form
+        """
+        return self._dom is None
+
     @property
     def empty(self) -> bool:
         return np.all(self.dom == 0)
@@ -58,10 +217,11 @@ class FuzzySet:
                            a: float,
                            b: float,
                            c: float,
-                           d: float) -> Any:
+                           d: float,
+                           parametric: bool = False,
+                           domain: NDArray = None) -> Any:
         """
-        TODO:
-         Implement trapezoidal membership function, following the formula from `fuzzy_logic_and_fuzzy_set.ipynb`
+        Trapezoidal membership function, following the formula from `fuzzy_logic_and_fuzzy_set.ipynb`
         :param name: name of the trapezoidal function
         :param domain_min: the minimum value of the trapezoidal function
         :param domain_max: the maximum value of the trapezoidal function
@@ -70,19 +230,20 @@ class FuzzySet:
         :param b: the special input
         :param c: the special input
         :param d: the special input
+        :param parametric: if True, only the breakpoints are stored and the membership is evaluated exactly,
+                           otherwise the breakpoints are snapped to the domain and the membership is sampled
+        :param domain: non-uniform domain values, see `__init__`
         :return: trapezoidal membership function
         """
         # initialize the result
-        t1fs = cls(name, domain_min, domain_max, res)
-        # retrieve the degree-of-membership of the inputs
-        a = t1fs.adjust_domain_val(a)
-        b = t1fs.adjust_domain_val(b)
-        c = t1fs.adjust_domain_val(c)
-        d = t1fs.adjust_domain_val(d)
-        #
-        t1fs.dom = None
-        # Write your code below
-
+        t1fs = cls(name, domain_min, domain_max, res, parametric=parametric, domain=domain)
+        t1fs.shape = 'trapezoidal'
+        if parametric:
+            t1fs.params = (a, b, c, d)
+        else:
+            # retrieve the degree-of-membership of the inputs
+            t1fs.params = tuple(t1fs.adjust_domain_val(x) for x in (a, b, c, d))
+            t1fs.dom = np.round(t1fs.membership(t1fs.domain), t1fs.precision)
         return t1fs
 
     @classmethod
@@ -93,10 +254,11 @@ class FuzzySet:
                           res: int,
                           a: float,
                           m: float,
-                          b: float) -> Any:
+                          b: float,
+                          parametric: bool = False,
+                          domain: NDArray = None) -> Any:
         """
-        TODO:
-         Implement triangular membership function, following the formula from `fuzzy_logic_and_fuzzy_set.ipynb`
+        Triangular membership function, following the formula from `fuzzy_logic_and_fuzzy_set.ipynb`
         :param name: name of the triangular function
         :param domain_min: the minimum value of the triangular function
         :param domain_max: the maximum value of the triangular function
@@ -104,27 +266,179 @@ class FuzzySet:
         :param a: the special input
         :param m: the special input
         :param b: the special input
+        :param parametric: if True, only the breakpoints are stored and the membership is evaluated exactly,
+                           otherwise the breakpoints are snapped to the domain and the membership is sampled
+        :param domain: non-uniform domain values, see `__init__`
         :return: the triangle membership function
         """
         # initialize the result
-        t1fs = cls(name, domain_min, domain_max, res)
-        # retrieve the degree-of-membership of the inputs
-        a = t1fs.adjust_domain_val(a)
-        m = t1fs.adjust_domain_val(m)
-        b = t1fs.adjust_domain_val(b)
-        #
-        t1fs.dom = None
-        # write your code below
-
+        t1fs = cls(name, domain_min, domain_max, res, parametric=parametric, domain=domain)
+        t1fs.shape = 'triangular'
+        if parametric:
+            t1fs.params = (a, m, b)
+        else:
+            # retrieve the degree-of-membership of the inputs
+            t1fs.params = tuple(t1fs.adjust_domain_val(x) for x in (a, m, b))
+            t1fs.dom = np.round(t1fs.membership(t1fs.domain), t1fs.precision)
         return t1fs
 
+    def membership(self, x: Any) -> Any:
+        """
+        Closed-form degree of membership from the breakpoints of the membership function
+        :param x: the input, a scalar or an array of inputs
+        :return: degree-of-membership value (or array of values)
+        """
+        (a, b), (c, d) = self.edges
+        return np.clip(np.minimum(self._ramp_up(x, a, b), self._ramp_down(x, c, d)), 0, 1)
+
+    @property
+    def edges(self) -> Any:
+        """
+        The rising and falling edges of the membership function, ((a, b), (c, d)) for a trapezoid
+        and ((a, m), (m, b)) for a triangle
+        """
+        if self.shape == 'triangular':
+            a, m, b = self.params
+            return (a, m), (m, b)
+        if self.shape == 'trapezoidal':
+            a, b, c, d = self.params
+            return (a, b), (c, d)
+        raise Exception(f'{self.name}: no membership function breakpoints!')
+
+    @property
+    def support(self) -> Any:
+        """
+        A closed interval outside of which the degree of membership of any input is 0, None if the set is empty.
+        For a sampled set the interval is widened by one domain value on each side, so that it holds
+        whether the lookups snap to the nearest domain value or interpolate
+        """
+        if self.parametric:
+            (a, _), (_, d) = self.edges
+            return a, d
+        nonzero = np.flatnonzero(self.dom)
+        if len(nonzero) == 0:
+            return None
+        lo = -np.inf if nonzero[0] == 0 else self.domain[nonzero[0] - 1]
+        hi = np.inf if nonzero[-1] == self.res - 1 else self.domain[nonzero[-1] + 1]
+        return lo, hi
+
+    @property
+    def peak(self) -> float:
+        """
+        The middle of the core of the membership function, where the degree of membership is 1
+        """
+        (_, b), (c, _) = self.edges
+        return (b + c) / 2
+
+    @staticmethod
+    def membership_params(x: NDArray, shape: str, params: NDArray) -> NDArray:
+        """
+        Closed-form degree of membership for arrays of breakpoints, e.g. a population of candidate sets
+        :param x: the inputs
+        :param shape: 'triangular' or 'trapezoidal'
+        :param params: array of breakpoints, the last axis holds (a, m, b) or (a, b, c, d); the other axes
+                       are broadcast against `x`
+        :return: array of degree-of-membership values
+        """
+        params = np.asarray(params, dtype=float)
+        if shape == 'triangular':
+            a, b, d = np.moveaxis(params, -1, 0)
+            c = b
+        elif shape == 'trapezoidal':
+            a, b, c, d = np.moveaxis(params, -1, 0)
+        else:
+            raise Exception(f'Unknown membership function {shape}!')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # vertical edges are shoulders, as in `_ramp_up` and `_ramp_down`
+            up = np.where(b == a, np.where(x >= b, 1., 0.), (x - a) / (b - a))
+            down = np.where(d == c, np.where(x <= c, 1., 0.), (d - x) / (d - c))
+        return np.clip(np.minimum(up, down), 0, 1)
+
+    @staticmethod
+    def _ramp_up(x: NDArray, lo: float, hi: float) -> NDArray:
+        """
+        Rising edge of a membership function, (x - lo) / (hi - lo).
+        A vertical edge (lo == hi) is a left shoulder that is 1 from `hi` onwards
+        """
+        if hi == lo:
+            return np.where(x >= hi, 1., 0.)
+        return (x - lo) / (hi - lo)
+
+    @staticmethod
+    def _ramp_down(x: NDArray, lo: float, hi: float) -> NDArray:
+        """
+        Falling edge of a membership function, (hi - x) / (hi - lo).
+        A vertical edge (lo == hi) is a right shoulder that is 1 up to `lo`
+        """
+        if hi == lo:
+            return np.where(x <= lo, 1., 0.)
+        return (hi - x) / (hi - lo)
+
     def adjust_domain_val(self, x: float) -> NDArray:
         """
         Retrieve degree-of-membership value in the domain array from the input
         :param x: the input
         :return: degree-of-membership value
         """
-        return self.domain[np.abs(self.domain - x).argmin()]
+        return self.domain[self.domain_index(x)]
+
+    def domain_index(self, x: Any) -> Any:
+        """
+        Index of the nearest domain value for each input, same as `np.abs(self.domain - x).argmin()`.
+        The two domain values around the input are located directly on a uniform domain, and by binary search
+        otherwise, then the nearest one is picked by comparing the distances as argmin does.
+        A NaN input, e.g. a missing sensor value, gets index 0 as with argmin
+        :param x: the input, a scalar or an array of inputs
+        :return: index (or array of indices) in the domain array
+        """
+        if self.res == 1:
+            return np.zeros(np.shape(x), dtype=np.intp)
+        domain = self.domain
+        if np.ndim(x) == 0:
+            # scalar lookups are on the inference hot path, stay in Python floats
+            x = float(x)
+            if x != x:
+                return 0
+            if self.uniform:
+                t = (x - self.domain_min) * ((self.res - 1) / (self.domain_max - self.domain_min))
+                idx = int(min(max(t, 0.), self.res - 2))
+            else:
+                idx = min(max(int(np.searchsorted(domain, x)), 1), self.res - 1) - 1
+            # ties go to the lower index, as argmin would pick the first minimum
+            return idx + (x - domain[idx] > domain[idx + 1] - x)
+        x = np.asarray(x, dtype=float)
+        if self.uniform:
+            # the rounding of the division can only miss by one when x is next to a domain value,
+            # which stays one of the two candidates
+            t = (x - self.domain_min) * ((self.res - 1) / (self.domain_max - self.domain_min))
+            np.floor(t, out=t)
+            # fmax and fmin, unlike clip, send NaN to the lower bound
+            np.fmax(t, 0, out=t)
+            np.fmin(t, self.res - 2, out=t)
+            idx = t.astype(np.intp)
+        else:
+            idx = np.clip(np.searchsorted(domain, x), 1, self.res - 1)
+            idx -= 1
+            # NaN sorts after every domain value
+            idx[np.isnan(x)] = 0
+        # ties go to the lower index, as argmin would pick the first minimum, and so does NaN
+        below = x - domain.take(idx)
+        above = domain.take(idx + 1)
+        above -= x
+        idx += below > above
+        return idx
+
+    def get_dom_values(self, x_vals: NDArray) -> NDArray:
+        """
+        Retrieve the degree-of-membership values for an array of inputs
+        :param x_vals: array of inputs
+        :return: array of degree-of-membership values, same shape as `x_vals`
+        """
+        if self.parametric:
+            return self.membership(x_vals)
+        if self.interpolate:
+            return np.interp(x_vals, self.domain, self.dom)
+        return self.dom[self.domain_index(x_vals)]
 
     def clear_set(self) -> None:
         """
@@ -138,74 +452,128 @@ class FuzzySet:
         :param x: the scalar
         :return: the scalar minimum of current fuzzy set and x
         """
-        # initialize the result
-        result = FuzzySet(f'({self.name}) min ({x})', self.domain_min, self.domain_max, self.res)
-        result.dom = np.minimum(self.dom, x)
-        return result
+        return self._derive(f'({self.name}) min ({x})', np.minimum(self.dom, x))
 
     def union(self, f_set: Any) -> Any:
         """
-        TODO:
-         Implement the Union operator of FuzzySet.
-         It is calculated by maximizing values of this FuzzySet and FuzzySet `f_set`.
+        The Union operator of FuzzySet.
+        It is calculated by maximizing values of this FuzzySet and FuzzySet `f_set`.
         :param f_set: the other fuzzy set to unite with
         :return: the union of current fuzzy set and f_set
         """
-        # initialize result
-        result = FuzzySet(name=f'({self.name}) union ({f_set.name})',
-                          domain_min=self.domain_min,
-                          domain_max=self.domain_max,
-                          res=self.res)
-        result.dom = None
-        # Write your code below
-
-        return result
+        return self._derive(f'({self.name}) union ({f_set.name})', np.maximum(self.dom, f_set.dom))
 
     def intersection(self, f_set: Any) -> Any:
         """
-        TODO:
-         Implement the Intersection operator of FuzzySet.
-         It is calculated by minimizing values of the this FuzzySet and FuzzySet `f_set`.
+        The Intersection operator of FuzzySet.
+        It is calculated by minimizing values of the this FuzzySet and FuzzySet `f_set`.
         :param f_set: the other fuzzy set to intersect with
         :return: the intersection of current fuzzy set and f_set
         """
-        # initialize result
-        result = FuzzySet(name=f'({self.name}) intersection ({f_set.name})',
-                          domain_min=self.domain_min,
-                          domain_max=self.domain_max,
-                          res=self.res)
-        result.dom = None
-        # Write your code below
-
-        return result
+        return self._derive(f'({self.name}) intersection ({f_set.name})', np.minimum(self.dom, f_set.dom))
 
     def complement(self) -> Any:
         """
-        TODO:
-         Implement the Completion operator of FuzzySet.
-         It is calculated by subtract the degree of membership value from 1.
+        The Completion operator of FuzzySet.
+        It is calculated by subtract the degree of membership value from 1.
         :return: the complement of current fuzzy set (self)
         """
-        # initialize result
-        result = FuzzySet(name=f'not ({self.name})',
-                          domain_min=self.domain_min,
-                          domain_max=self.domain_max,
-                          res=self.res)
-        result.dom = None
-        # Write your code below
+        return self._derive(f'not ({self.name})', 1 - self.dom)
 
+    def _derive(self, name: str, dom: NDArray) -> Any:
+        """
+        A new set over the same domain as this set, holding `dom` without copying it
+        :param name: the name of the new set
+        :param dom: the degree-of-membership values of the new set
+        :return: the new fuzzy set
+        """
+        result = FuzzySet(name, self.domain_min, self.domain_max, self.res, parametric=True)
+        result._domain = self._domain
+        result._uniform = self._uniform
+        result._dom = dom
         return result
 
     def defuzzify_cog(self) -> Any:
         """
-        TODO:
-         Implement the defuzzification using center-of-area or center-of-gravity
+        The defuzzification using center-of-area or center-of-gravity
         :return: crisp quantities
         """
-        result = None
-        # write your code below
+        if not self.uniform:
+            areas, moments = cell_weights(self.domain)
+            num, den = np.dot(self.dom, moments), np.dot(self.dom, areas)
+        else:
+            num, den = np.dot(self.dom, self.domain), np.sum(self.dom)
+        # an empty set has no center of gravity
+        return num / den if den != 0 else np.nan
 
-        return result
+    def defuzzify_mom(self) -> Any:
+        """
+        The defuzzification using mean-of-maximum, the average of the domain values of maximum membership
+        :return: crisp quantities
+        """
+        dom = self.dom
+        height = dom.max()
+        if height == 0:
+            return np.nan
+        if not self.uniform:
+            # the domain values stand for cells of different widths
+            areas = cell_weights(self.domain)[0] * (dom == height)
+            return np.dot(areas, self.domain) / np.sum(areas)
+        return np.mean(self.domain[dom == height])
+
+    def defuzzify_bisector(self) -> Any:
+        """
+        The defuzzification using bisector-of-area, the domain value splitting the area in two halves
+        :return: crisp quantities
+        """
+        cumulative = np.cumsum(self.dom if self.uniform else self.dom * cell_weights(self.domain)[0])
+        if cumulative[-1] == 0:
+            return np.nan
+        return self.domain[np.searchsorted(cumulative, cumulative[-1] / 2)]
+
+    @staticmethod
+    def defuzzify_centroid_union(f_sets: Any, heights: Any, domain_min: float, domain_max: float) -> float:
+        """
+        Exact center-of-gravity of the union of triangular/trapezoidal sets clipped at the given heights,
+        computed in closed form from the breakpoints, without sampling the domain.
+        The union is piecewise linear, so it is integrated exactly between its kinks: the breakpoints of the
+        clipped sets and the crossings between the edges and levels of different sets
+        :param f_sets: the sets, they must have breakpoints
+        :param heights: the clipping height of each set
+        :param domain_min: the minimum of the domain
+        :param domain_max: the maximum of the domain
+        :return: crisp quantities
+        """
+        knots = [domain_min, domain_max]
+        lines = [(0., 0.)]  # (slope, intercept) of every edge and level
+        for f_set, h in zip(f_sets, heights):
+            (a, b), (c, d) = f_set.edges
+            knots += [a, b, c, d, a + h * (b - a), d - h * (d - c)]
+            lines.append((0., h))
+            if b > a:
+                lines.append((1 / (b - a), -a / (b - a)))
+            if d > c:
+                lines.append((-1 / (d - c), d / (d - c)))
+        slope, intercept = np.array(lines).T
+        with np.errstate(divide='ignore', invalid='ignore'):
+            crossings = (intercept[None, :] - intercept[:, None]) / (slope[:, None] - slope[None, :])
+        knots = np.concatenate([knots, crossings[np.isfinite(crossings)]])
+        knots = np.unique(knots[(knots >= domain_min) & (knots <= domain_max)])
+        x0, x1 = knots[:-1], knots[1:]
+        dx = x1 - x0
+        # the union is linear between two knots, evaluate it inside and extrapolate to the knots,
+        # this keeps vertical edges from leaking their value into the neighbouring interval
+        inner = np.concatenate([x0 + dx / 3, x0 + 2 * dx / 3])
+        union = np.zeros(inner.shape)
+        for f_set, h in zip(f_sets, heights):
+            np.maximum(union, np.minimum(f_set.membership(inner), h), out=union)
+        f1, f2 = union[:len(dx)], union[len(dx):]
+        y0, y1 = 2 * f1 - f2, 2 * f2 - f1
+        area = np.sum((y0 + y1) * dx) / 2
+        if area <= 0:
+            return np.nan
+        moment = np.sum(dx * (x0 * (2 * y0 + y1) + x1 * (y0 + 2 * y1))) / 6
+        return moment / area
 
     def get_domain_elements(self) -> NDArray:
         """
@@ -223,8 +591,5 @@ class FuzzySet:
         """
         Visualize the fuzzy set
         """
-        ax.plot(self.domain, self.dom, col)
-        ax.set_ylim([-0.1, 1.1])
-        ax.set_title(self.name)
-        ax.grid(True, which='both', alpha=0.4)
-        ax.set(xlabel='x', ylabel='$\mu(x)$')
+        from .fuzzy_plot import plot_set
+        plot_set(self, ax, col)
@@ -0,0 +1,122 @@
+import csv
+import queue
+import threading
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List
+from numpy.typing import NDArray
+import numpy as np
+
+
+def iter_array_chunks(array: NDArray, chunk_size: int = 65536, names: List[str] = None,
+                      copy: bool = False) -> Iterator[Dict[str, NDArray]]:
+    """
+    Splits an array of inputs into chunks of rows: a memory-mapped array is read chunk by chunk
+    :param array: a structured array, whose fields are the input names, or a 2D array with one column per input
+    :param chunk_size: the number of rows per chunk
+    :param names: the input names of the columns of a 2D array, None yields the 2D chunks as they are
+    :param copy: if True the chunks are copied, so a memory-mapped file is read by the thread iterating the chunks
+                 (e.g. the `prefetch` thread) rather than by the one using them
+    :return: an iterator of dicts in the form {input_variable_name: array, ...}
+    """
+    for start in range(0, len(array), chunk_size):
+        chunk = array[start:start + chunk_size]
+        if copy:
+            chunk = np.array(chunk)
+        yield chunk if chunk.dtype.names is None and names is None else chunk_to_dict(chunk, names)
+
+
+def read_npy_chunks(path: str, chunk_size: int = 65536, names: List[str] = None) -> Iterator[Dict[str, NDArray]]:
+    """
+    Reads a `.npy` file of inputs chunk by chunk, the file is memory-mapped and never fully loaded
+    :param path: the file path
+    :param chunk_size: the number of rows per chunk
+    :param names: the input names of the columns of a 2D array, None yields the 2D chunks as they are
+    :return: an iterator of dicts in the form {input_variable_name: array, ...}
+    """
+    return iter_array_chunks(np.load(path, mmap_mode='r'), chunk_size, names, copy=True)
+
+
+def read_csv_chunks(path: str, chunk_size: int = 65536, names: List[str] = None,
+                    delimiter: str = ',') -> Iterator[Dict[str, NDArray]]:
+    """
+    Reads a CSV file of inputs chunk by chunk, holding at most `chunk_size` rows in memory
+    :param path: the file path
+    :param chunk_size: the number of rows per chunk
+    :param names: the input names of the columns, None reads them from the first row of the file
+    :param delimiter: the column delimiter
+    :return: an iterator of dicts in the form {input_variable_name: array, ...}
+    """
+    with open(path, newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        if names is None:
+            names = [name.strip() for name in next(reader)]
+        while True:
+            rows = list(islice(reader, chunk_size))
+            if not rows:
+                return
+            yield chunk_to_dict(np.array(rows, dtype=float).reshape(len(rows), -1), names)
+
+
+def chunk_to_dict(chunk: Any, names: List[str] = None) -> Dict[str, NDArray]:
+    """
+    Converts a chunk of inputs to the dict form used by `FuzzySystem.evaluate_output_batch`
+    :param chunk: a dict of arrays, a structured array or a 2D array with one column per input
+    :param names: the input names of the columns of a 2D array
+    :return: a dict in the form {input_variable_name: array, ...}
+    """
+    if isinstance(chunk, dict):
+        return chunk
+    chunk = np.asarray(chunk)
+    if chunk.dtype.names is not None:
+        return {name: chunk[name] for name in chunk.dtype.names}
+    if names is None:
+        raise Exception('The column names of a 2D array are required!')
+    return {name: chunk[:, k] for k, name in enumerate(names)}
+
+
+def prefetch(chunks: Iterable[Any], depth: int = 1) -> Iterator[Any]:
+    """
+    Reads the chunks on a background thread, up to `depth` chunks ahead of the consumer,
+    so that reading the next chunk overlaps with the processing of the current one
+    :param chunks: an iterable of chunks
+    :param depth: the maximum number of chunks read ahead
+    :return: an iterator of the same chunks
+    """
+    buffer = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    done = object()
+
+    def produce() -> None:
+        try:
+            for chunk in chunks:
+                while not stop.is_set():
+                    try:
+                        buffer.put((chunk, None), timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if stop.is_set():
+                    return
+            item = (done, None)
+        except BaseException as e:    # re-raised in the consumer
+            item = (done, e)
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    thread = threading.Thread(target=produce, daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk, error = buffer.get()
+            if chunk is done:
+                if error is not None:
+                    raise error
+                return
+            yield chunk
+    finally:
+        # the consumer stopped early or finished, let the producer exit
+        stop.set()
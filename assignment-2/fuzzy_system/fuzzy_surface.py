@@ -0,0 +1,135 @@
+import json
+from bisect import bisect_right
+from typing import Any, Dict, List
+from numpy.typing import NDArray
+import numpy as np
+
+
+class FuzzySurface:
+    """
+    The control surface of a fuzzy system: the crisp outputs precomputed over a grid of input values,
+    queried by multilinear interpolation.
+    The table is stored as a `.npy` file that can be memory-mapped and shared by many processes
+    """
+
+    def __init__(self, input_names: List[str], output_names: List[str], axes: List[NDArray], table: NDArray) -> None:
+        """
+        Creates the control surface
+        :param input_names: the names of the input variables, one per grid dimension
+        :param output_names: the names of the output variables, in the order of the last dimension of `table`
+        :param axes: the increasing grid values of each input variable
+        :param table: array of shape (len(axes[0]), ..., len(axes[-1]), len(output_names)) holding the crisp outputs
+        """
+        self.input_names = list(input_names)
+        self.output_names = list(output_names)
+        self.axes = [np.asarray(axis, dtype=float) for axis in axes]
+        self.table = table
+        self._axes_lists = [axis.tolist() for axis in self.axes]    # for the bisection of single queries
+        self.max_error = None   # the maximum interpolation error per output, set by `validate`
+
+    def __str__(self) -> str:
+        grid = ' x '.join(f'{name}[{len(axis)}]' for name, axis in zip(self.input_names, self.axes))
+        return f'{grid} -> {", ".join(self.output_names)}'
+
+    def evaluate_output(self, input_values: Dict[str, Any]) -> Dict[str, NDArray]:
+        """
+        Interpolates the outputs for a set (or a batch) of inputs. Inputs outside the grid are clamped to its bounds
+        :param input_values: a dict containing the inputs in the form {input_variable_name: value or array, ...}
+        :return: a dict containing the outputs in the form {output_variable_name: value or array, ...}
+        """
+        values = [np.asarray(input_values[name], dtype=float) for name in self.input_names]
+        shape = np.broadcast_shapes(*[value.shape for value in values])
+        if shape == ():
+            result = self._evaluate_point([float(value) for value in values])
+            return {name: result[k] for k, name in enumerate(self.output_names)}
+        # locate the grid cell and the position inside the cell along every dimension
+        lower, frac = [], []
+        for axis, value in zip(self.axes, values):
+            value = np.broadcast_to(value, shape).ravel()
+            idx = np.clip(np.searchsorted(axis, value, side='right') - 1, 0, len(axis) - 2)
+            lower.append(idx)
+            frac.append(np.clip((value - axis[idx]) / (axis[idx + 1] - axis[idx]), 0, 1))
+        # weighted sum over the 2^d corners of the cell
+        result = np.zeros((int(np.prod(shape)), len(self.output_names)))
+        for corner in range(2 ** len(self.axes)):
+            weight = np.ones(result.shape[0])
+            index = []
+            for dim in range(len(self.axes)):
+                if corner >> dim & 1:
+                    weight *= frac[dim]
+                    index.append(lower[dim] + 1)
+                else:
+                    weight *= 1 - frac[dim]
+                    index.append(lower[dim])
+            result += weight[:, None] * self.table[tuple(index)]
+        return {name: result[:, k].reshape(shape) for k, name in enumerate(self.output_names)}
+
+    def _evaluate_point(self, values: List[float]) -> NDArray:
+        """
+        Multilinear interpolation of a single input point, without the overhead of the vectorized path
+        :param values: the value of each input variable
+        :return: array of the interpolated outputs
+        """
+        lower, frac = [], []
+        for axis, value in zip(self._axes_lists, values):
+            idx = min(max(bisect_right(axis, value) - 1, 0), len(axis) - 2)
+            lower.append(idx)
+            frac.append(min(max((value - axis[idx]) / (axis[idx + 1] - axis[idx]), 0.), 1.))
+        result = 0.
+        for corner in range(2 ** len(lower)):
+            weight = 1.
+            index = []
+            for dim in range(len(lower)):
+                if corner >> dim & 1:
+                    weight *= frac[dim]
+                    index.append(lower[dim] + 1)
+                else:
+                    weight *= 1 - frac[dim]
+                    index.append(lower[dim])
+            if weight:
+                result = result + weight * self.table[tuple(index)]
+        return np.asarray(result)
+
+    def validate(self, system: Any, n_samples: int = 1000, seed: Any = None) -> Dict[str, float]:
+        """
+        Measures the interpolation error against the exact inference on random inputs inside the grid.
+        The result is also stored in `self.max_error`
+        :param system: the FuzzySystem the surface was compiled from
+        :param n_samples: the number of validation inputs
+        :param seed: seed of the random generator
+        :return: a dict containing the maximum absolute error in the form {output_variable_name: error, ...}
+        """
+        rng = np.random.default_rng(seed)
+        samples = {name: rng.uniform(axis[0], axis[-1], n_samples) for name, axis in zip(self.input_names, self.axes)}
+        exact = system.evaluate_output_batch(samples)
+        approx = self.evaluate_output(samples)
+        self.max_error = {name: float(np.nanmax(np.abs(exact[name] - approx[name]))) for name in self.output_names}
+        return self.max_error
+
+    def save(self, path: str) -> None:
+        """
+        Saves the table to `path.npy` and the grid description to `path.json`
+        :param path: the file path, without extension
+        """
+        path = path[:-4] if path.endswith('.npy') else path
+        np.save(path + '.npy', np.ascontiguousarray(self.table))
+        with open(path + '.json', 'w') as f:
+            json.dump({'inputs': self.input_names,
+                       'outputs': self.output_names,
+                       'axes': [axis.tolist() for axis in self.axes],
+                       'max_error': self.max_error}, f)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: Any = 'r') -> Any:
+        """
+        Loads a surface saved by `save`
+        :param path: the file path, without extension
+        :param mmap_mode: memory-map mode of the table passed to `np.load`, None reads it into memory
+        :return: the control surface
+        """
+        path = path[:-4] if path.endswith('.npy') else path
+        with open(path + '.json') as f:
+            header = json.load(f)
+        surface = cls(header['inputs'], header['outputs'], header['axes'], np.load(path + '.npy', mmap_mode=mmap_mode))
+        surface.max_error = header['max_error']
+        return surface
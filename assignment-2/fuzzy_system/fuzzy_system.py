@@ -1,13 +1,35 @@
-from typing import Any
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import perf_counter
+import json
+import struct
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import threading
+from numpy.typing import NDArray
+import numpy as np
+from .fuzzy_clause import FuzzyClause
 from .fuzzy_rule import FuzzyRule
+from .fuzzy_rule_tsk import FuzzyRuleTSK
 from .fuzzy_variable_output import FuzzyVariableOutput
 from .fuzzy_variable_input import FuzzyVariableInput
-import matplotlib.pyplot as plt
+from .fuzzy_surface import FuzzySurface
+from .fuzzy_context import FuzzyContext
+from .fuzzy_set import FuzzySet, next_version
+from .fuzzy_profiler import FuzzyProfiler
+from .fuzzy_stream import chunk_to_dict, prefetch
+
+# magic bytes of the binary model format written by `FuzzySystem.save`
+_MAGIC = b'FUZZYSYS'
+_ALIGNMENT = 64
 
 
 class FuzzySystem:
     """
     A type-1 fuzzy system based on Mamdani inference system
+    The inference state is kept in a FuzzyContext, one per thread by default, so a system that is
+    no longer modified can be evaluated from many threads at once
     Reference:
     ----------
     Mamdani, Ebrahim H., and Sedrak Assilian.
@@ -21,12 +43,45 @@ class FuzzySystem:
             input variables -- dict, having format {variable_name: FuzzyVariableInput, ...}
             output variables -- dict, having format {variable_name: FuzzyVariableOutput, ...}
             rules -- list of FuzzyRule
+            tsk rules -- list of FuzzyRuleTSK, whose outputs are crisp functions of the inputs
             output_distribution -- dict holding fuzzy output for each variable having format
                                 {variable_name: FuzzySet, ...}
         """
         self.input_variables = {}   # a dict of input variables
         self.output_variables = {}  # a dict of output variables
         self.rules = []     # a list that contains FuzzyRules
+        self.tsk_rules = []     # a list that contains FuzzyRuleTSKs
+        self.tsk_outputs = []   # the names of the outputs concluded by TSK rules
+        self.version = next_version()   # renewed whenever a variable or a rule is added
+        # dependency index, {variable_name: array of rule indices}, for incremental re-evaluation
+        self._rules_by_input = {}
+        self._rules_by_output = {}
+        # the clauses of the rules, shared by all the rules using the same set, {(variable, FuzzySet): FuzzyClause}
+        self._clauses = {}
+        # support-interval index to find the rules that can fire, built on demand by `_get_rule_index`
+        self._rule_index = None
+        # the default evaluation context of each thread
+        self._local = threading.local()
+        # optional LRU cache of the outputs of `evaluate_output`, see `enable_cache`
+        self._cache_lock = threading.Lock()
+        self._cache = None
+        self._cache_maxsize = 0
+        self._cache_signature = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # optional instrumentation of `evaluate_output`, see `enable_profiling`
+        self.profiler = None
+
+    def __getstate__(self) -> dict:
+        # thread-local contexts and locks are not picklable, they are created again by __setstate__
+        state = self.__dict__.copy()
+        del state['_local'], state['_cache_lock']
+        return state
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
 
     def __str__(self) -> str:
         """
@@ -48,145 +103,927 @@ class FuzzySystem:
         for n, s in self.output_variables.items():
             ret_str = ret_str + f'{n}: ({s})\n'
         ret_str = ret_str + 'Rules: \n'
-        for rule in self.rules:
+        for rule in self.rules + self.tsk_rules:
             ret_str = ret_str + f'{rule}\n'
         return ret_str
 
     def add_input_variable(self, var: FuzzyVariableInput) -> None:
         """
-        TODO:
-         Add a FuzzyVariableInput `var` to `self.input_variables`
+        Add a FuzzyVariableInput `var` to `self.input_variables`
         :param var: the input fuzzy variable
         """
-        # Write the code below
-
-        pass
+        self.input_variables[var.name] = var
+        self.version = next_version()
 
     def add_output_variable(self, var: FuzzyVariableOutput) -> None:
         """
-        TODO:
-         Add a FuzzyVariableOutput `var` to `self.output_variables`
+        Add a FuzzyVariableOutput `var` to `self.output_variables`
         :param var: the output fuzzy variable
         """
-        # Write the code below
-
-        pass
+        self.output_variables[var.name] = var
+        self.version = next_version()
 
     def get_input_variable(self, name: str) -> FuzzyVariableInput:
         """
-        TODO:
-         Get a FuzzyVariableInput given by `name`
+        Get a FuzzyVariableInput given by `name`
         :param name: name of variable
         """
-        var = None
-        # Write your code below
-
-        return var
+        return self.input_variables[name]
 
     def get_output_variable(self, name: str) -> FuzzyVariableOutput:
         """
-        TODO:
-         Get a FuzzyVariableOutput given by `name`
+        Get a FuzzyVariableOutput given by `name`
         :param name: name of variable
         """
-        var = None
-        # Write your code below
+        return self.output_variables[name]
+
+    def create_context(self) -> FuzzyContext:
+        """
+        Creates an evaluation context, to be passed to the `evaluate_output*` methods by callers that
+        manage the inference state themselves
+        """
+        return FuzzyContext()
 
-        return var
+    def get_context(self) -> FuzzyContext:
+        """
+        The default evaluation context of the calling thread
+        """
+        context = getattr(self._local, 'context', None)
+        if context is None:
+            context = self._local.context = self.create_context()
+        return context
 
-    def clear_output_distributions(self) -> None:
+    def clear_output_distributions(self, context: Any = None) -> None:
         """
         Used for each iteration. The fuzzy result is cleared
+        :param context: the FuzzyContext of the inference, None clears the output distributions of the variables
         """
-        map(lambda output_var: output_var.clear_output_distribution(), self.output_variables.values())
+        for output_var in self.output_variables.values():
+            output_var.clear_output_distribution(context)
 
     def add_rule(self, antecedent_clause_names: dict, consequent_clause_names: dict) -> None:
         """
-        TODO:
-         Adds a new rule to the system from dictionaries of antecedent and consequent clause names
+        Adds a new rule to the system from dictionaries of antecedent and consequent clause names
         :param antecedent_clause_names: a dict of clause, having the form {variable_name: set_name, ...}
         :param consequent_clause_names: having the form {variable_name: set_name, ...}
         """
         # create a new rule
         new_rule = FuzzyRule()
-        # add antecedent clauses
+        # add the antecedent and consequent clauses, a clause is created once and shared by the rules using it
+        antecedents = [self._get_clause(self.get_input_variable(var_name), set_name)
+                       for var_name, set_name in antecedent_clause_names.items()]
+        consequents = [self._get_clause(self.get_output_variable(var_name), set_name)
+                       for var_name, set_name in consequent_clause_names.items()]
+        new_rule.add_clauses(antecedents, consequents)
+        # add the new rule
+        self.rules.append(new_rule)
+        self.version = next_version()
+        # index the rule by the variables it depends on and concludes on
+        index = len(self.rules) - 1
+        for var_name in antecedent_clause_names:
+            self._rules_by_input.setdefault(var_name, array('q')).append(index)
+        for var_name in consequent_clause_names:
+            self._rules_by_output.setdefault(var_name, array('q')).append(index)
+
+    def _add_rule_table(self, table: NDArray) -> None:
+        """
+        Adds Mamdani rules from a table of set indices, as written by `save`, without going through the set names:
+        the clauses are created once per column, and the dependency index is filled a column at a time
+        :param table: R x V array, the index of the set of each rule in each input then output variable, -1 if none
+        """
+        variables = list(self.input_variables.values()) + list(self.output_variables.values())
+        n_inputs = len(self.input_variables)
+        table = np.asarray(table)
+        if table.ndim != 2 or table.shape[1] != len(variables):
+            raise Exception(f'The rule table has {table.shape[-1]} columns, not {len(variables)}!')
+        first = len(self.rules)
+        columns = []
+        for v, var in enumerate(variables):
+            column = table[:, v]
+            keys = list(var.sets)
+            if column.size and (column.min() < -1 or column.max() >= len(keys)):
+                raise Exception(f'The rule table refers to a set {var.name} does not have!')
+            # the clause of each set index, and None for -1, the last entry
+            clauses = np.full(len(keys) + 1, None, dtype=object)
+            for k in np.unique(column[column >= 0]).tolist():
+                clauses[k] = self._get_clause(var, keys[k])
+            columns.append(clauses[column].tolist())
+            rules = np.flatnonzero(column >= 0).astype(np.int64) + first
+            if rules.size:
+                by_var = self._rules_by_input if v < n_inputs else self._rules_by_output
+                by_var.setdefault(var.name, array('q')).frombytes(rules.tobytes())
+        for row in zip(*columns):
+            new_rule = FuzzyRule()
+            new_rule.add_clauses([clause for clause in row[:n_inputs] if clause is not None],
+                                 [clause for clause in row[n_inputs:] if clause is not None])
+            self.rules.append(new_rule)
+        self.version = next_version()
+        if first == 0:
+            # the table already is the support-interval index of the rules
+            self._rule_index = {'signature': self._signature(), 'names': list(self.input_variables),
+                                'supports': self._input_supports(), 'table': table[:, :n_inputs].astype(np.intp)}
+
+    def _get_clause(self, var: Any, set_name: str) -> FuzzyClause:
+        """
+        The clause 'var is set_name', created on first use
+        :param var: the input or output variable
+        :param set_name: the name of a set of `var`
+        :return: the clause
+        """
+        f_set = var.get_set(set_name)
+        clause = self._clauses.get((var, f_set))
+        if clause is None:
+            clause = self._clauses[(var, f_set)] = FuzzyClause(var, f_set)
+        return clause
+
+    def add_tsk_rule(self, antecedent_clause_names: dict, consequent_functions: dict) -> None:
+        """
+        Adds a new Takagi-Sugeno-Kang rule to the system. The output of a TSK output is the average of the rule
+        functions weighted by the rule strengths, so no output distribution is built nor defuzzified
+        :param antecedent_clause_names: a dict of clause, having the form {variable_name: set_name, ...}
+        :param consequent_functions: a dict of linear functions, having the form
+                                     {output_name: constant or (constant, {input_variable_name: coefficient, ...}), ...}
+        """
+        new_rule = FuzzyRuleTSK()
         for var_name, set_name in antecedent_clause_names.items():
-            # write your code here
-            # get the input variable and corresponding fuzzy set for the antecedent clause
-            # and then add the clause to `new_rule`
+            var = self.get_input_variable(var_name)
+            new_rule.add_antecedent_clause(var, var.get_set(set_name))
+        for output_name, function in consequent_functions.items():
+            if output_name in self.output_variables:
+                raise Exception(f'{output_name} is a Mamdani output variable!')
+            if np.isscalar(function):
+                function = (function, {})
+            new_rule.add_consequent_function(output_name, *function)
+            if output_name not in self.tsk_outputs:
+                self.tsk_outputs.append(output_name)
+        self.tsk_rules.append(new_rule)
+        self.version = next_version()
+
+    def enable_cache(self, maxsize: int = 1024) -> None:
+        """
+        Memoizes `evaluate_output` in a bounded LRU cache.
+        When every input set is sampled and snaps to its nearest domain value, the inputs are quantized to the
+        resolution of their variables, so inputs falling on the same domain values share an entry. With TSK rules,
+        or parametric or interpolating input sets, the outputs depend on the exact inputs, which are the key then.
+        The cache is invalidated whenever a variable, set or rule changes,
+        and the entries are keyed by the interpolation of the input sets and the defuzzifiers as well
+        :param maxsize: the maximum number of cached outputs
+        """
+        self._cache = OrderedDict()
+        self._cache_maxsize = maxsize
+        self._cache_signature = self._signature()
+
+    def disable_cache(self) -> None:
+        """
+        Stops memoizing `evaluate_output` and drops the cached outputs
+        """
+        self._cache = None
 
-            pass
+    def clear_cache(self) -> None:
+        """
+        Drops the cached outputs and resets the hit/miss counters
+        """
+        if self._cache is not None:
+            self._cache.clear()
+        self.cache_hits = 0
+        self.cache_misses = 0
 
-            # add consequent clauses
-            for var_name, set_name in consequent_clause_names.items():
-                # write your code here
-                # get the output variable and corresponding fuzzy set for the consequent clause
-                # and then add the clause to `new_rule`
+    def cache_info(self) -> dict:
+        """
+        :return: a dict with the cache statistics, {'hits': ..., 'misses': ..., 'size': ..., 'maxsize': ...}
+        """
+        return {'hits': self.cache_hits,
+                'misses': self.cache_misses,
+                'size': 0 if self._cache is None else len(self._cache),
+                'maxsize': self._cache_maxsize}
 
-                pass
+    def enable_profiling(self, profiler: FuzzyProfiler = None) -> FuzzyProfiler:
+        """
+        Attaches a profiler to `evaluate_output`, which then accounts the time of each inference stage
+        and the fire counts and strengths of the rules
+        :param profiler: the profiler to attach, None attaches a new one
+        :return: the attached profiler
+        """
+        self.profiler = FuzzyProfiler() if profiler is None else profiler
+        return self.profiler
 
-        # add the new rule
+    def disable_profiling(self) -> FuzzyProfiler:
+        """
+        Detaches the profiler
+        :return: the detached profiler, holding the collected statistics
+        """
+        profiler, self.profiler = self.profiler, None
+        return profiler
+
+    @contextmanager
+    def profile(self, profiler: FuzzyProfiler = None) -> Any:
+        """
+        Profiles the evaluations made inside a `with` block, then restores the previous profiler:
+            with system.profile() as profiler:
+                ...
+            print(profiler.report(system))
+        :param profiler: the profiler to attach, None attaches a new one
+        """
+        previous = self.profiler
+        try:
+            yield self.enable_profiling(profiler)
+        finally:
+            self.profiler = previous
+
+    def _signature(self) -> int:
+        """
+        Increases whenever a variable, a set or a rule of the system changes
+        """
+        variables = list(self.input_variables.values()) + list(self.output_variables.values())
+        return max(self.version, max((var.signature for var in variables), default=0))
+
+    def _settings(self) -> tuple:
+        """
+        The settings that change the outputs without changing `_signature`: whether each input set interpolates
+        and the defuzzifier of each output variable
+        """
+        return (tuple(f_set.interpolate for var in self.input_variables.values() for f_set in var.sets.values()),
+                tuple(var.defuzzifier for var in self.output_variables.values()))
 
-        pass
+    def _cache_key(self, input_values: Any) -> tuple:
+        """
+        The key of a set of inputs in the cache, see `enable_cache`
+        """
+        settings = self._settings()
+        exact = bool(self.tsk_rules) or any(settings[0]) or any(
+            f_set.parametric for var in self.input_variables.values() for f_set in var.sets.values())
+        if exact:
+            return (settings,) + tuple((name, float(value)) for name, value in input_values.items())
+        return (settings,) + tuple((name, self.input_variables[name].quantize(value))
+                                   for name, value in input_values.items())
 
-    def evaluate_output(self, input_values: Any) -> Any:
+    def _check_input_names(self, input_values: Any) -> None:
+        """
+        Raises an exception when an input is not an input variable of the system
+        """
+        unknown = input_values.keys() - self.input_variables.keys()
+        if unknown:
+            raise Exception(f'{", ".join(sorted(unknown))}: unknown input variable!')
+
+    def evaluate_output(self, input_values: Any, context: Any = None) -> Any:
         """
         Executes the fuzzy inference system for a set of inputs
         :param input_values: a dict containing the inputs to the systems in the form {input_variable_name: value, ...}
+        :param context: the FuzzyContext holding the inference state, None uses the context of the calling thread
         :return: a dict, containing the outputs from the systems in the form {output_variable_name: value, ...}
         """
+        if context is None:
+            context = self.get_context()
+        self._check_input_names(input_values)
+        profiler = self.profiler
+        key = None
+        if self._cache is not None:
+            key = self._cache_key(input_values)
+            with self._cache_lock:
+                signature = self._signature()
+                if signature != self._cache_signature:
+                    self._cache.clear()
+                    self._cache_signature = signature
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    self.cache_hits += 1
+                    if profiler is not None:
+                        profiler.add_evaluation(cache_hit=True)
+                    return dict(self._cache[key])
+                self.cache_misses += 1
+        if profiler is not None:
+            return self._evaluate_output_profiled(input_values, context, profiler, key)
+        context.incremental_state = None
         # clear the fuzzy consequences as we are evaluating a new set of inputs.
-        # can be optimized by comparing if the inputs have changes from the previous
-        # iteration.
-        self.clear_output_distributions()
-        # Fuzzify the inputs. The degree of membership will be stored in each set
-        for input_name, input_value in input_values.items():
-            self.input_variables[input_name].fuzzify(input_value)
-        # evaluate rules
-        for rule in self.rules:
-            rule.evaluate()
+        self.clear_output_distributions(context)
+        # Fuzzify the inputs. The degree of membership will be stored in the context
+        candidate_rules = self._fuzzify_active(input_values, context)
+        # evaluate the rules that can have a nonzero strength, the others contribute nothing
+        for r in candidate_rules:
+            self.rules[r].evaluate(context)
         # finally, defuzzify all output distributions to get the crisp outputs
         output = {}
         for output_var_name, output_var in self.output_variables.items():
-            output[output_var_name] = output_var.get_crisp_output()
+            output[output_var_name] = output_var.get_crisp_output(context)
+        output.update(self._evaluate_tsk_rules(input_values, context))
+        if key is not None:
+            self._store_in_cache(key, output)
+        return output
+
+    def _store_in_cache(self, key: tuple, output: dict) -> None:
+        with self._cache_lock:
+            self._cache[key] = dict(output)
+            if len(self._cache) > self._cache_maxsize:
+                self._cache.popitem(last=False)
+
+    def _evaluate_output_profiled(self, input_values: Any, context: Any, profiler: FuzzyProfiler,
+                                  key: tuple = None) -> Any:
+        """
+        Same as `evaluate_output`, accounting the time of each stage and the rule strengths in `profiler`
+        """
+        clock = perf_counter
+        profiler.add_evaluation()
+        context.incremental_state = None
+        start = clock()
+        self.clear_output_distributions(context)
+        candidate_rules = self._fuzzify_active(input_values, context)
+        profiler.add_time('fuzzify', clock() - start)
+        profiler.fire_rules(self.rules, candidate_rules, context)
+        start = clock()
+        output = {}
+        for output_var_name, output_var in self.output_variables.items():
+            output[output_var_name] = output_var.get_crisp_output(context)
+        profiler.add_time('defuzzify', clock() - start)
+        if self.tsk_rules:
+            start = clock()
+            output.update(self._evaluate_tsk_rules(input_values, context))
+            profiler.add_time('tsk', clock() - start)
+        if key is not None:
+            self._store_in_cache(key, output)
+        return output
+
+    def _get_rule_index(self) -> dict:
+        """
+        The support-interval index, rebuilt whenever the system changes:
+            names -- the input variable names, in the order of the columns of `table`
+            supports -- the support bounds of the sets of each input variable, {variable_name: (lo, hi), ...}
+            table -- R x V array, the index of the antecedent set of each rule in each variable, -1 if none
+        """
+        signature = self._signature()
+        index = self._rule_index
+        if index is not None and index['signature'] == signature:
+            return index
+        names = list(self.input_variables)
+        table = np.full((len(self.rules), len(names)), -1, dtype=np.intp)
+        for r, rule in enumerate(self.rules):
+            for ante_clause in rule.antecedents:
+                v = names.index(ante_clause.variable_name)
+                table[r, v] = ante_clause.var.set_index(ante_clause.f_set)
+        index = self._rule_index = {'signature': signature, 'names': names, 'supports': self._input_supports(),
+                                    'table': table}
+        return index
+
+    def _input_supports(self) -> dict:
+        """
+        The support bounds of the sets of each input variable, an empty support being (inf, -inf)
+        :return: a dict of the form {variable_name: (lo, hi), ...}, lo and hi being arrays over the sets
+        """
+        supports = {}
+        for name, var in self.input_variables.items():
+            bounds = [f_set.support or (np.inf, -np.inf) for f_set in var.sets.values()]
+            supports[name] = tuple(np.array(bounds, dtype=float).reshape(-1, 2).T)
+        return supports
+
+    def _fuzzify_active(self, input_values: Any, context: Any) -> NDArray:
+        """
+        Fuzzifies the inputs, looking up only the sets whose support contains the input
+        :param input_values: a dict containing the inputs to the systems in the form {input_variable_name: value, ...}
+        :param context: the FuzzyContext of the inference
+        :return: the indices of the rules whose antecedent sets are all active
+        """
+        index = self._get_rule_index()
+        candidates = np.ones(len(self.rules), dtype=bool)
+        for v, name in enumerate(index['names']):
+            if name not in input_values:
+                continue
+            value = input_values[name]
+            lo, hi = index['supports'][name]
+            active = (lo <= value) & (value <= hi)
+            self.input_variables[name].fuzzify(value, context, active)
+            if len(active):
+                column = index['table'][:, v]
+                candidates &= (column < 0) | active[column]
+        return np.flatnonzero(candidates)
+
+    def evaluate_output_parallel(self, input_values_list: List[Any], max_workers: int = None,
+                                 use_processes: bool = False, chunksize: int = 1) -> List[Any]:
+        """
+        Fans `evaluate_output` over a pool of threads (each with its own context) or of processes
+        (each with its own copy of the system)
+        :param input_values_list: a list of input dicts in the form {input_variable_name: value, ...}
+        :param max_workers: the number of workers, None lets the executor decide
+        :param use_processes: if True use a process pool, otherwise a thread pool
+        :param chunksize: the number of inputs sent at once to a worker process
+        :return: the list of output dicts, in the order of `input_values_list`
+        """
+        if use_processes:
+            with ProcessPoolExecutor(max_workers, initializer=_init_worker, initargs=(self,)) as executor:
+                return list(executor.map(_evaluate_in_worker, input_values_list, chunksize=chunksize))
+        with ThreadPoolExecutor(max_workers) as executor:
+            return list(executor.map(self.evaluate_output, input_values_list))
+
+    def _evaluate_tsk_rules(self, input_values: Any, context: Any = None) -> Any:
+        """
+        Weighted average of the TSK rule functions. The inputs must have been fuzzified already
+        :param input_values: a dict containing the inputs to the systems in the form {input_variable_name: value, ...}
+        :param context: the FuzzyContext of the inference
+        :return: a dict, containing the TSK outputs in the form {output_name: value, ...}
+        """
+        num = dict.fromkeys(self.tsk_outputs, 0.)
+        den = dict.fromkeys(self.tsk_outputs, 0.)
+        for rule in self.tsk_rules:
+            rule_strength = rule.evaluate_strength(context)
+            if rule_strength == 0:
+                continue
+            for output_name, value in rule.evaluate_consequents(input_values).items():
+                num[output_name] += rule_strength * value
+                den[output_name] += rule_strength
+        return {name: num[name] / den[name] if den[name] else np.nan for name in self.tsk_outputs}
+
+    def evaluate_output_incremental(self, input_values: Any, context: Any = None) -> Any:
+        """
+        Executes the fuzzy inference system for a set of inputs, re-evaluating only what depends on the inputs
+        that changed since the previous call: their variables are fuzzified again, the rules using them are
+        re-fired and only the output variables whose rules changed strength are aggregated and defuzzified again
+        :param input_values: a dict containing the inputs to the systems in the form {input_variable_name: value, ...}
+        :param context: the FuzzyContext holding the inference state, None uses the context of the calling thread
+        :return: a dict, containing the outputs from the systems in the form {output_variable_name: value, ...}
+        """
+        if context is None:
+            context = self.get_context()
+        self._check_input_names(input_values)
+        state = context.incremental_state
+        signature = self._signature(), self._settings()
+        if state is None or state['signature'] != signature:
+            # nothing to reuse, start from a full evaluation
+            state = {'signature': signature, 'inputs': {}, 'strengths': [0] * len(self.rules), 'output': {}}
+            changed_inputs = list(input_values)
+            changed_rules = range(len(self.rules))
+            changed_outputs = set(self.output_variables)
+        else:
+            changed_inputs = [name for name, value in input_values.items() if state['inputs'].get(name) != value]
+            changed_rules = sorted({r for name in changed_inputs for r in self._rules_by_input.get(name, [])})
+            changed_outputs = set()
+        # Fuzzify the inputs that changed
+        for input_name in changed_inputs:
+            self.input_variables[input_name].fuzzify(input_values[input_name], context)
+            state['inputs'][input_name] = input_values[input_name]
+        # re-evaluate the rules depending on them
+        strengths = state['strengths']
+        for r in changed_rules:
+            rule_strength = self.rules[r].evaluate_strength(context)
+            if rule_strength != strengths[r]:
+                strengths[r] = rule_strength
+                changed_outputs.update(clause.variable_name for clause in self.rules[r].consequents)
+        # aggregate again the output distributions touched by the rules that changed
+        for output_var_name in changed_outputs:
+            output_var = self.output_variables[output_var_name]
+            output_var.clear_output_distribution(context)
+            for r in self._rules_by_output.get(output_var_name, []):
+                for consequent_clause in self.rules[r].consequents:
+                    if consequent_clause.variable_name == output_var_name:
+                        consequent_clause.evaluate_consequent(strengths[r], context)
+            state['output'][output_var_name] = output_var.get_crisp_output(context)
+        context.incremental_state = state
+        # the TSK functions depend on the crisp inputs, they are always evaluated again
+        output = dict(state['output'])
+        output.update(self._evaluate_tsk_rules(state['inputs'], context))
+        return output
+
+    def evaluate_output_batch(self, input_values: Dict[str, NDArray], chunk_size: int = 4096) -> Dict[str, NDArray]:
+        """
+        Executes the fuzzy inference system for a batch of inputs.
+        The N x R rule-strength matrix is computed at once and the output distributions are aggregated
+        and defuzzified in NumPy, `chunk_size` samples at a time to bound the memory of the distributions.
+        :param input_values: a dict containing arrays of inputs in the form {input_variable_name: array, ...}
+        :param chunk_size: the maximum number of samples aggregated together
+        :return: a dict containing arrays of outputs in the form {output_variable_name: array, ...}
+        """
+        input_values = {name: np.asarray(value, dtype=float) for name, value in input_values.items()}
+        n = np.broadcast_shapes(*[value.shape for value in input_values.values()])
+        input_values = {name: np.broadcast_to(value, n).ravel() for name, value in input_values.items()}
+        # Fuzzify the inputs. The degrees of membership are kept as {(variable_name, set_name): array, ...}
+        fuzzified = {}
+        for input_name, values in input_values.items():
+            for set_name, dom in self.input_variables[input_name].fuzzify_batch(values).items():
+                fuzzified[(input_name, set_name)] = dom
+        # evaluate rules, the strength is the minimum of the antecedent degrees of membership
+        strengths = self._rule_strengths_batch(self.rules, fuzzified, int(np.prod(n)))
+        # aggregate and defuzzify all output distributions chunk by chunk
+        output = {}
+        for output_var_name, output_var in self.output_variables.items():
+            columns, f_sets = [], []
+            for r, rule in enumerate(self.rules):
+                for consequent_clause in rule.consequents:
+                    if consequent_clause.variable_name == output_var_name:
+                        columns.append(r)
+                        f_sets.append(consequent_clause.f_set)
+            crisp = np.empty(strengths.shape[0])
+            for start in range(0, strengths.shape[0], chunk_size):
+                stop = start + chunk_size
+                crisp[start:stop] = output_var.get_crisp_output_batch(strengths[start:stop, columns], f_sets)
+            output[output_var_name] = crisp.reshape(n)
+        # TSK outputs are the strength-weighted averages of the rule functions
+        if self.tsk_rules:
+            tsk_strengths = self._rule_strengths_batch(self.tsk_rules, fuzzified, int(np.prod(n)))
+            num = {name: np.zeros(tsk_strengths.shape[0]) for name in self.tsk_outputs}
+            den = {name: np.zeros(tsk_strengths.shape[0]) for name in self.tsk_outputs}
+            for r, rule in enumerate(self.tsk_rules):
+                for output_name, value in rule.evaluate_consequents(input_values).items():
+                    num[output_name] += tsk_strengths[:, r] * value
+                    den[output_name] += tsk_strengths[:, r]
+            for name in self.tsk_outputs:
+                # NaN where no rule fires, as in `_evaluate_tsk_rules`
+                output[name] = np.divide(num[name], den[name], out=np.full_like(num[name], np.nan),
+                                         where=den[name] != 0).reshape(n)
+        return output
+
+    def evaluate_output_stream(self, chunks: Iterable[Any], chunk_size: int = 4096, prefetch_depth: int = 0,
+                               names: List[str] = None) -> Iterator[Dict[str, NDArray]]:
+        """
+        Executes the fuzzy inference system over a stream of input chunks, e.g. `read_csv_chunks` or
+        `read_npy_chunks` of a log larger than memory, yielding the outputs chunk by chunk.
+        Only the current chunk (and the prefetched ones) are held in memory
+        :param chunks: an iterable of chunks, each a dict in the form {input_variable_name: array, ...},
+                       a structured array or a 2D array with one column per input
+        :param chunk_size: the maximum number of samples aggregated together, see `evaluate_output_batch`
+        :param prefetch_depth: the number of chunks read ahead on a background thread, 0 reads them inline
+        :param names: the input names of the columns of 2D array chunks, by default the input variables in order
+        :return: an iterator of dicts in the form {output_variable_name: array, ...}, one per input chunk
+        """
+        if names is None:
+            names = list(self.input_variables)
+        if prefetch_depth > 0:
+            chunks = prefetch(chunks, prefetch_depth)
+        for chunk in chunks:
+            yield self.evaluate_output_batch(chunk_to_dict(chunk, names), chunk_size)
+
+    @staticmethod
+    def _rule_strengths_batch(rules: list, fuzzified: dict, n: int) -> NDArray:
+        """
+        The N x R rule-strength matrix, the minimum of the antecedent degrees of membership of each rule
+        :param rules: the R rules
+        :param fuzzified: the degrees of membership in the form {(variable_name, set_name): array, ...}
+        :param n: the number of samples N
+        :return: array of rule strengths
+        """
+        strengths = np.ones((n, len(rules)))
+        for r, rule in enumerate(rules):
+            for ante_clause in rule.antecedents:
+                np.minimum(strengths[:, r], fuzzified[(ante_clause.variable_name, ante_clause.set_key)],
+                           out=strengths[:, r])
+        return strengths
+
+    def save(self, path: str) -> None:
+        """
+        Saves the system in a binary format: a JSON header describing the variables, sets and TSK rules,
+        followed by a raw body holding the sampled degree-of-membership arrays and the Mamdani rule table.
+        The body can be memory-mapped by `load`, so loading does not sample any membership function again
+        File layout: magic bytes, header length (uint64), JSON header, padding, body
+        :param path: the file path
+        """
+        arrays = []
+        offset = 0
+
+        def add_array(array: NDArray) -> list:
+            # register an array of the body, aligned for zero-copy views
+            nonlocal offset
+            array = np.ascontiguousarray(array)
+            entry = [array.dtype.str, offset, list(array.shape)]
+            arrays.append(array)
+            offset += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+            return entry
+
+        def describe(var: Any) -> dict:
+            sets = []
+            for key, f_set in var.sets.items():
+                sets.append({'key': key,
+                             'name': f_set.name,
+                             'shape': f_set.shape,
+                             'params': None if f_set.params is None else [float(p) for p in f_set.params],
+                             'dom': None if f_set.parametric else add_array(f_set.dom)})
+            return {'name': var.name, 'min': float(var.min_val), 'max': float(var.max_val), 'res': int(var.res),
+                    'domain': None if var.uniform else add_array(var.domain), 'sets': sets}
+
+        inputs = [describe(var) for var in self.input_variables.values()]
+        outputs = [dict(describe(var), defuzzifier=var.defuzzifier) for var in self.output_variables.values()]
+        # Mamdani rules as a table of set indices, -1 when a variable is not in the rule
+        variables = list(self.input_variables.values()) + list(self.output_variables.values())
+        table = np.full((len(self.rules), len(variables)), -1, dtype=np.int32)
+        columns = {var.name: v for v, var in enumerate(variables)}
+        for r, rule in enumerate(self.rules):
+            for clause in rule.antecedents + rule.consequents:
+                table[r, columns[clause.variable_name]] = clause.var.set_index(clause.f_set)
+        tsk_rules = [[{clause.variable_name: clause.set_key for clause in rule.antecedents},
+                      {name: [constant, coefficients] for name, (constant, coefficients) in rule.consequents.items()}]
+                     for rule in self.tsk_rules]
+        header = json.dumps({'inputs': inputs,
+                             'outputs': outputs,
+                             'rules': add_array(table),
+                             'tsk_rules': tsk_rules}).encode()
+        body_start = -(-(len(_MAGIC) + 8 + len(header)) // _ALIGNMENT) * _ALIGNMENT
+        with open(path, 'wb') as f:
+            f.write(_MAGIC + struct.pack('<Q', len(header)) + header)
+            f.write(b'\0' * (body_start - f.tell()))
+            for array in arrays:
+                f.write(array.tobytes())
+                f.write(b'\0' * (-array.nbytes % _ALIGNMENT))
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = 'c') -> Any:
+        """
+        Loads a system saved by `save`. The sampled sets are views into the memory-mapped body
+        :param path: the file path
+        :param mmap_mode: 'c' (copy-on-write), 'r' (read-only) or 'r+', as for `np.memmap`; None reads the file
+        :return: the fuzzy system
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise Exception(f'{path}: not a fuzzy system file!')
+            header_len, = struct.unpack('<Q', f.read(8))
+            header = json.loads(f.read(header_len))
+        body_start = -(-(len(_MAGIC) + 8 + header_len) // _ALIGNMENT) * _ALIGNMENT
+        if mmap_mode is None:
+            body = np.fromfile(path, dtype=np.uint8, offset=body_start)
+        else:
+            body = np.memmap(path, dtype=np.uint8, mode=mmap_mode, offset=body_start)
+
+        def get_array(entry: list) -> NDArray:
+            dtype, offset, shape = entry
+            dtype = np.dtype(dtype)
+            return body[offset:offset + dtype.itemsize * int(np.prod(shape))].view(dtype).reshape(shape)
+
+        def get_domain(description: dict) -> Any:
+            # the non-uniform domain values, if any; files written before they were saved have none
+            entry = description.get('domain')
+            return None if entry is None else get_array(entry)
+
+        def restore(var: Any, description: dict) -> Any:
+            for set_description in description['sets']:
+                f_set = FuzzySet(set_description['name'], var.min_val, var.max_val, var.res, parametric=True,
+                                 domain=None if var.uniform else var.domain)
+                f_set.shape = set_description['shape']
+                f_set.params = None if set_description['params'] is None else tuple(set_description['params'])
+                if set_description['dom'] is not None:
+                    f_set.dom = get_array(set_description['dom'])
+                # files written before the keys were saved register the sets under their names
+                var.add_set(set_description.get('key', f_set.name), f_set)
+            return var
+
+        system = cls()
+        for description in header['inputs']:
+            system.add_input_variable(restore(FuzzyVariableInput(description['name'], description['min'],
+                                                                 description['max'], description['res'],
+                                                                 domain=get_domain(description)), description))
+        for description in header['outputs']:
+            system.add_output_variable(restore(FuzzyVariableOutput(description['name'], description['min'],
+                                                                   description['max'], description['res'],
+                                                                   description['defuzzifier'],
+                                                                   domain=get_domain(description)), description))
+        system._add_rule_table(get_array(header['rules']))
+        for antecedents, consequents in header['tsk_rules']:
+            system.add_tsk_rule(antecedents, {name: tuple(function) for name, function in consequents.items()})
+        return system
+
+    def parameter_layout(self) -> List[Tuple[str, str, int]]:
+        """
+        The columns of a parameter matrix of `evaluate_output_population`: the breakpoints of every triangular
+        or trapezoidal set, input variables first then output variables, in the order the sets were added
+        :return: a list of (variable_name, set_name, breakpoint index) tuples, one per column
+        """
+        layout = []
+        for var in list(self.input_variables.values()) + list(self.output_variables.values()):
+            for set_name, f_set in var.sets.items():
+                if f_set.shape is not None:
+                    layout.extend((var.name, set_name, k) for k in range(len(f_set.params)))
+        return layout
+
+    def get_parameters(self) -> NDArray:
+        """
+        The breakpoints of the sets of the system, in the order of `parameter_layout`
+        :return: array of K parameters
+        """
+        variables = {**self.input_variables, **self.output_variables}
+        return np.array([variables[var_name].get_set(set_name).params[k]
+                         for var_name, set_name, k in self.parameter_layout()], dtype=float)
+
+    def evaluate_output_population(self, parameters: NDArray, input_values: Dict[str, NDArray],
+                                   chunk_size: int = 8192) -> Dict[str, NDArray]:
+        """
+        Executes P candidate systems over N samples at once. The candidates share the variables and rules of
+        this system and differ by the breakpoints of their sets, e.g. a population of a tuning algorithm.
+        The membership functions are evaluated exactly, as for sets created with `parametric=True`;
+        sets without breakpoints keep their sampled degrees of membership.
+        The system itself is left unchanged
+        :param parameters: P x K array, the breakpoints of each candidate in the order of `parameter_layout`
+        :param input_values: a dict containing arrays of N inputs in the form {input_variable_name: array, ...}
+        :param chunk_size: the maximum number of (candidate, sample) pairs aggregated together, which bounds the
+                           memory to about `chunk_size` output distributions
+        :return: a dict containing P x N arrays of outputs in the form {output_variable_name: array, ...}
+        """
+        layout = self.parameter_layout()
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=float))
+        if parameters.shape[1] != len(layout):
+            raise Exception(f'{parameters.shape[1]} parameters given, the system has {len(layout)}!')
+        # the columns of each set, {(variable_name, set_name): slice, ...}
+        columns = {}
+        for k, (var_name, set_name, _) in enumerate(layout):
+            start = columns.get((var_name, set_name), slice(k, k)).start
+            columns[(var_name, set_name)] = slice(start, k + 1)
+        input_values = {name: np.asarray(value, dtype=float).ravel() for name, value in input_values.items()}
+        n = len(next(iter(input_values.values())))
+        n_candidates = parameters.shape[0]
+        output = {name: np.empty((n_candidates, n)) for name in list(self.output_variables) + self.tsk_outputs}
+        # the chunks are split over the candidates as well when there are more candidates than `chunk_size`
+        candidate_step = max(1, min(n_candidates, chunk_size))
+        step = max(1, chunk_size // candidate_step)
+        for first in range(0, n_candidates, candidate_step):
+            last = min(first + candidate_step, n_candidates)
+            for start in range(0, n, step):
+                stop = min(start + step, n)
+                chunk = {name: value[start:stop] for name, value in input_values.items()}
+                for name, values in self._evaluate_population_chunk(parameters[first:last], columns, chunk,
+                                                                    stop - start).items():
+                    output[name][first:last, start:stop] = values
+        return output
+
+    def _evaluate_population_chunk(self, parameters: NDArray, columns: dict, input_values: Dict[str, NDArray],
+                                   n: int) -> Dict[str, NDArray]:
+        """
+        `evaluate_output_population` over one chunk of n samples
+        :return: a dict containing P x n arrays of outputs in the form {output_variable_name: array, ...}
+        """
+        n_candidates = parameters.shape[0]
+        # Fuzzify the inputs, P x n (or 1 x n for sets without breakpoints) degrees of membership
+        fuzzified = {}
+        for input_name, values in input_values.items():
+            for set_name, f_set in self.input_variables[input_name].sets.items():
+                if f_set.shape is None:
+                    fuzzified[(input_name, set_name)] = f_set.get_dom_values(values)[None, :]
+                else:
+                    params = parameters[:, columns[(input_name, set_name)]]
+                    fuzzified[(input_name, set_name)] = FuzzySet.membership_params(values, f_set.shape,
+                                                                                   params[:, None, :])
+
+        def strength(rule: Any) -> NDArray:
+            result = np.ones((n_candidates, n))
+            for ante_clause in rule.antecedents:
+                np.minimum(result, fuzzified[(ante_clause.variable_name, ante_clause.set_key)], out=result)
+            return result
+
+        output = {}
+        for output_var_name, output_var in self.output_variables.items():
+            # clipping height of each consequent set, P x n
+            heights = {}
+            for rule in self.rules:
+                for consequent_clause in rule.consequents:
+                    if consequent_clause.variable_name == output_var_name:
+                        height = heights.get(consequent_clause.set_key)
+                        if height is None:
+                            heights[consequent_clause.set_key] = strength(rule)
+                        else:
+                            np.maximum(height, strength(rule), out=height)
+            output[output_var_name] = self._defuzzify_population(output_var, parameters, columns, heights, n)
+        # TSK outputs are the strength-weighted averages of the rule functions
+        if self.tsk_rules:
+            num = {name: np.zeros((n_candidates, n)) for name in self.tsk_outputs}
+            den = {name: np.zeros((n_candidates, n)) for name in self.tsk_outputs}
+            for rule in self.tsk_rules:
+                rule_strength = strength(rule)
+                for output_name, value in rule.evaluate_consequents(input_values).items():
+                    num[output_name] += rule_strength * value
+                    den[output_name] += rule_strength
+            for name in self.tsk_outputs:
+                output[name] = np.divide(num[name], den[name], out=np.full_like(num[name], np.nan),
+                                         where=den[name] != 0)
         return output
 
-    def evaluate_output_info(self, input_values: Any) -> Any:
+    @staticmethod
+    def _defuzzify_population(output_var: FuzzyVariableOutput, parameters: NDArray, columns: dict,
+                              heights: Dict[str, NDArray], n: int) -> NDArray:
+        """
+        Aggregates and defuzzifies the clipped consequent sets of P candidates over n samples
+        :param heights: the P x n clipping heights of each consequent set, {set_name: array, ...}
+        :return: P x n array of crisp outputs
+        """
+        n_candidates = parameters.shape[0]
+        if not heights:
+            return np.full((n_candidates, n), np.nan)
+
+        def params_of(set_name: str) -> NDArray:
+            return parameters[:, columns[(output_var.name, set_name)]]
+
+        if output_var.defuzzifier == 'peaks':
+            num = np.zeros((n_candidates, n))
+            den = np.zeros((n_candidates, n))
+            for set_name, height in heights.items():
+                f_set = output_var.get_set(set_name)
+                if f_set.shape is None:
+                    peak = f_set.peak
+                else:
+                    params = params_of(set_name)
+                    peak = ((params[:, 1] + params[:, -2]) / 2)[:, None]
+                num += height * peak
+                den += height
+            return np.divide(num, den, out=np.full_like(num, np.nan), where=den != 0)
+        if output_var.defuzzifier == 'centroid':
+            # the closed form is not vectorized, it runs per candidate and per sample
+            result = np.empty((n_candidates, n))
+            for p in range(n_candidates):
+                f_sets = []
+                for set_name in heights:
+                    f_set = output_var.get_set(set_name)
+                    if f_set.shape is not None:
+                        f_set = FuzzySet(set_name, output_var.min_val, output_var.max_val, output_var.res,
+                                         parametric=True)
+                        f_set.shape = output_var.get_set(set_name).shape
+                        f_set.params = tuple(params_of(set_name)[p])
+                    f_sets.append(f_set)
+                for j in range(n):
+                    result[p, j] = FuzzySet.defuzzify_centroid_union(
+                        f_sets, [height[p, j] for height in heights.values()], output_var.min_val, output_var.max_val)
+            return result
+        # sampled defuzzifiers, the distributions of all the (candidate, sample) pairs are built at once
+        domain = output_var.domain
+        distribution = np.zeros((n_candidates, n, len(domain)))
+        clipped = np.empty_like(distribution)
+        for set_name, height in heights.items():
+            f_set = output_var.get_set(set_name)
+            if f_set.shape is None:
+                dom = f_set.dom[None, None, :]
+            else:
+                dom = FuzzySet.membership_params(domain, f_set.shape, params_of(set_name)[:, None, None, :])
+            np.minimum(height[:, :, None], dom, out=clipped)
+            np.maximum(distribution, clipped, out=distribution)
+        return output_var.defuzzify_distributions(distribution.reshape(-1, len(domain))).reshape(n_candidates, n)
+
+    def compile_surface(self, grid_spec: Dict[str, Any], n_validation: int = 1000, seed: Any = None) -> FuzzySurface:
+        """
+        Precomputes the crisp outputs over a grid of input values, to be queried by multilinear interpolation
+        :param grid_spec: the grid of each input variable in the form {input_variable_name: grid, ...}, where grid is
+                          either a number of points evenly spaced over the variable domain or an increasing array
+        :param n_validation: the number of random inputs used to measure the interpolation error, 0 skips it
+        :param seed: seed of the random generator used for the validation
+        :return: the control surface of the Mamdani and TSK outputs,
+                 its `max_error` holds the maximum interpolation error of each output
+        """
+        input_names = list(self.input_variables)
+        axes = []
+        for name in input_names:
+            grid = grid_spec[name]
+            if np.isscalar(grid):
+                var = self.input_variables[name]
+                grid = np.linspace(var.min_val, var.max_val, int(grid))
+            axes.append(np.asarray(grid, dtype=float))
+        output_names = list(self.output_variables) + self.tsk_outputs
+        if not output_names:
+            raise Exception('The system has no output to compile!')
+        points = np.meshgrid(*axes, indexing='ij')
+        output = self.evaluate_output_batch({name: point.ravel() for name, point in zip(input_names, points)})
+        table = np.stack([output[name].reshape(points[0].shape) for name in output_names], axis=-1)
+        surface = FuzzySurface(input_names, output_names, axes, table)
+        if n_validation > 0:
+            surface.validate(self, n_validation, seed)
+        return surface
+
+    def evaluate_output_info(self, input_values: Any, context: Any = None) -> Any:
         """
         Executes the fuzzy inference system for a set of inputs
         :param input_values: a dict containing the inputs to the systems in the form {input_variable_name: value, ...}
-        :return: a dict containing the outputs from the systems in the form {output_variable_name: value, ...}
+        :param context: the FuzzyContext holding the inference state, None uses the context of the calling thread
+        :return: a dict containing the outputs from the systems in the form {output_variable_name: value, ...},
+                 and a dict of the form {'fuzzification': str, 'rules': str,
+                 'distributions': {output_variable_name: FuzzySet, ...}}
         """
+        if context is None:
+            context = self.get_context()
         info = {}
+        context.incremental_state = None
         # clear the fuzzy consequences as we are evaluating a new set of inputs.
         # can be optimized by comparing if the inputs have changes from the previous
         # iteration.
-        self.clear_output_distributions()
+        self.clear_output_distributions(context)
         # Fuzzify the inputs. The degree of membership will be stored in
-        # each set
+        # the context
         fuzzification_info = []
         for input_name, input_value in input_values.items():
-            fuzzification_info.append(self.input_variables[input_name].fuzzify_info(input_value))
+            fuzzification_info.append(self.input_variables[input_name].fuzzify_info(input_value, context))
         info['fuzzification'] = '\n'.join(fuzzification_info)
         # evaluate rules
         rule_info = []
         for rule in self.rules:
-            rule_info.append(rule.evaluate_info())
+            rule_info.append(rule.evaluate_info(context))
         info['rules'] = '\n'.join(rule_info)
         # finally, defuzzify all output distributions to get the crisp outputs
         output = {}
+        info['distributions'] = {}
         for output_var_name, output_var in self.output_variables.items():
-            output[output_var_name], info = output_var.get_crisp_output_info()
+            output[output_var_name], info['distributions'][output_var_name] = output_var.get_crisp_output_info(context)
+        output.update(self._evaluate_tsk_rules(input_values, context))
         return output, info
 
     def plot_system(self):
-        total_var_count = len(self.input_variables) + len(self.output_variables)
-        if total_var_count < 2:
-            total_var_count = 2
-        fig, axs = plt.subplots(total_var_count, 1)
-        fig.tight_layout(pad=1.0)
-        for idx, var_name in enumerate(self.input_variables):
-            self.input_variables[var_name].plot_variable(ax=axs[idx], show=False)
-        for idx, var_name in enumerate(self.output_variables):
-            self.output_variables[var_name].plot_variable(ax=axs[len(self.input_variables) + idx], show=False)
-        plt.show()
+        from .fuzzy_plot import plot_system
+        plot_system(self)
+
+
+def _init_worker(system: FuzzySystem) -> None:
+    """
+    Initializer of the worker processes of `FuzzySystem.evaluate_output_parallel`
+    """
+    global _worker_system
+    _worker_system = system
+
+
+def _evaluate_in_worker(input_values: Any) -> Any:
+    return _worker_system.evaluate_output(input_values)
@@ -1,6 +1,7 @@
 from typing import Any
-from .fuzzy_set import FuzzySet
-import matplotlib.pyplot as plt
+import numpy as np
+from numpy.typing import NDArray
+from .fuzzy_set import FuzzySet, as_domain, next_version, shared_domain
 
 
 class FuzzyVariable:
@@ -8,94 +9,192 @@ class FuzzyVariable:
     A type-1 fuzzy variable that is mage up of a number of type-1 fuzzy sets
     """
 
-    def __init__(self, name: str, min_val: float, max_val: float, res: int) -> None:
+    def __init__(self, name: str, min_val: float, max_val: float, res: int, *, domain: NDArray = None) -> None:
         """
         Creates a new type-1 fuzzy variable (universe)
         :param name: the name of variable
         :param min_val: minimum value of variable
         :param max_val: maximum value of variable
         :param res: resolution of variable
+        :param domain: increasing domain values to use instead of `res` evenly spaced ones,
+                       it then sets `min_val`, `max_val` and `res`
         """
         self.sets = {}  # a list that contains FuzzySet
+        self._keys = {}     # the key of each set in `self.sets`, {FuzzySet: key, ...}
+        self._domain = None     # the non-uniform domain values, None for `res` evenly spaced values
+        if domain is not None:
+            self._domain = as_domain(domain)
+            min_val, max_val, res = self._domain[0], self._domain[-1], len(self._domain)
         self.max_val = max_val
         self.min_val = min_val
         self.res = res
         self.name = name
+        self.version = next_version()   # renewed whenever a set is added
 
     def __str__(self) -> str:
         return ', '.join(self.sets.keys())
 
+    @property
+    def domain(self) -> NDArray:
+        """
+        The read-only domain array of the variable, shared by reference by all its sets
+        """
+        if self._domain is None:
+            return shared_domain(self.min_val, self.max_val, self.res)
+        return self._domain
+
+    @property
+    def uniform(self) -> bool:
+        """
+        True when the domain values are evenly spaced
+        """
+        return self._domain is None
+
+    def set_domain(self, domain: NDArray) -> None:
+        """
+        Moves the variable and all its sets onto other domain values, see `FuzzySet.resample`
+        :param domain: the increasing domain values, e.g. from `breakpoint_domain`
+        """
+        self._domain = as_domain(domain)
+        self.min_val, self.max_val, self.res = self._domain[0], self._domain[-1], len(self._domain)
+        for f_set in self.sets.values():
+            f_set.resample(self._domain)
+        self.version = next_version()
+
+    def breakpoints(self) -> NDArray:
+        """
+        The distinct breakpoints of the sets inside the domain, and the domain bounds
+        :return: the increasing breakpoints
+        """
+        knots = {float(self.min_val), float(self.max_val)}
+        for f_set in self.sets.values():
+            if f_set.params is not None:
+                knots.update(float(p) for p in f_set.params if self.min_val <= p <= self.max_val)
+        return np.array(sorted(knots))
+
+    def breakpoint_domain(self, res: int) -> NDArray:
+        """
+        Non-uniform domain values concentrated around the breakpoints of the sets.
+        Every breakpoint is a domain value, so the sets are represented exactly, and the other values are spread
+        over the intervals between breakpoints in proportion to their length, denser near their ends
+        :param res: the number of domain values, at least the number of distinct breakpoints
+        :return: the increasing domain values
+        """
+        knots = self.breakpoints()
+        extra = res - len(knots)
+        if extra < 0:
+            raise Exception(f'{self.name}: {res} values cannot hold the {len(knots)} breakpoints!')
+        # share the extra values between the intervals in proportion to their length (largest remainder)
+        lengths = np.diff(knots)
+        quota = extra * lengths / lengths.sum()
+        counts = np.floor(quota).astype(int)
+        counts[np.argsort(counts - quota)[:extra - counts.sum()]] += 1
+        values = [knots[:1]]
+        for lo, hi, count in zip(knots[:-1], knots[1:], counts):
+            # cosine spacing, the interior values get denser near the breakpoints at both ends
+            t = (1 - np.cos(np.pi * np.arange(1, count + 2) / (count + 1))) / 2
+            values.append(lo + (hi - lo) * t)
+        return np.concatenate(values)
+
     def add_set(self, name: str, f_set: FuzzySet) -> None:
         """
-        TODO:
-         Adds FuzzySet `f_set` into dictionary `self.sets` with key `name`
+        Adds FuzzySet `f_set` into dictionary `self.sets` with key `name`
         :param name: name of the set
         :param f_set: the fuzzy set
         """
-        # write code below
-
-        pass
+        replaced = self.sets.get(name)
+        if replaced is not None:
+            self._keys.pop(replaced, None)
+        self.sets[name] = f_set
+        self._keys[f_set] = name
+        self.version = next_version()
 
     def get_set(self, name: str) -> FuzzySet:
         """
-        TODO:
-         Return a FuzzySet given the `name`
+        Return a FuzzySet given the `name`
         :param name: set name
         """
-        f_set = None
-        # Write your code below
+        return self.sets[name]
+
+    def set_key(self, f_set: FuzzySet) -> str:
+        """
+        The key a set is registered under in `self.sets`, which may differ from `f_set.name`
+        :param f_set: a set of the variable
+        :return: the key of the set
+        """
+        key = self._keys.get(f_set)
+        if key is None or self.sets.get(key) is not f_set:
+            # the set was put in `self.sets` directly
+            key = next((k for k, s in self.sets.items() if s is f_set), None)
+            if key is None:
+                raise Exception(f'{f_set.name} is not a set of {self.name}!')
+            self._keys[f_set] = key
+        return key
 
-        return f_set
+    def set_index(self, f_set: FuzzySet) -> int:
+        """
+        The position of a set in `self.sets`
+        :param f_set: a set of the variable
+        :return: the index of the set
+        """
+        return list(self.sets).index(self.set_key(f_set))
 
-    def add_triangular(self, name: str, low: float, mid: float, high: float) -> FuzzySet:
+    def quantize(self, value: float) -> int:
         """
-        TODO:
-         Create a triangular membership function from given arguments.
-         Then add the created triangular membership function to `self.sets`
+        Index of the nearest of the `res` values of the variable domain, same as `FuzzySet.domain_index`
+        :param value: value of the variable
+        :return: index in the variable domain
+        """
+        if self.res == 1 or value != value:
+            # NaN gets index 0 as with argmin
+            return 0
+        domain = self._domain if self._domain is not None else shared_domain(self.min_val, self.max_val, self.res)
+        idx = min(max(int(np.searchsorted(domain, value)), 1), self.res - 1)
+        # ties go to the lower index, as argmin would pick the first minimum
+        return idx - int(value - domain[idx - 1] <= domain[idx] - value)
+
+    @property
+    def signature(self) -> int:
+        """
+        Increases whenever a set is added to the variable or the membership function of a set changes
+        """
+        return max(self.version, max((f_set.version for f_set in self.sets.values()), default=0))
+
+    def add_triangular(self, name: str, low: float, mid: float, high: float, parametric: bool = False) -> FuzzySet:
+        """
+        Create a triangular membership function from given arguments.
+        Then add the created triangular membership function to `self.sets`
         :param name: set name
         :param low: a value
         :param mid: m value
         :param high: b value
+        :param parametric: if True, the set keeps only its breakpoints and evaluates the membership exactly
         """
-        new_set = None
-        # write the code below
-
+        new_set = FuzzySet.create_triangular(name, self.min_val, self.max_val, self.res, low, mid, high, parametric,
+                                             self._domain)
+        self.add_set(name, new_set)
         return new_set
 
-    def add_trapezoidal(self, name: str, a: float, b: float, c: float, d: float) -> FuzzySet:
+    def add_trapezoidal(self, name: str, a: float, b: float, c: float, d: float,
+                        parametric: bool = False) -> FuzzySet:
         """
-        TODO:
-         Create a trapezoidal membership function from given arguments.
-         Then add the created trapezoidal membership function to `self.sets`
+        Create a trapezoidal membership function from given arguments.
+        Then add the created trapezoidal membership function to `self.sets`
         :param name: set name
         :param a: a value
         :param b: b value
         :param c: c value
         :param d: d value
+        :param parametric: if True, the set keeps only its breakpoints and evaluates the membership exactly
         """
-        new_set = None
-        # Write your code below
-
+        new_set = FuzzySet.create_trapezoidal(name, self.min_val, self.max_val, self.res, a, b, c, d, parametric,
+                                              self._domain)
+        self.add_set(name, new_set)
         return new_set
 
     def plot_variable(self, ax: Any = None, show: bool = True) -> None:
         """
-        Plots a graphical representation of the fuzzy variable
-        Reference:
-        ----------
-            https://stackoverflow.com/questions/4700614/how-to-put-the-legend-out-of-the-plot
-        """
-        if ax is None:
-            ax = plt.subplot(111)
-        for n, s in self.sets.items():
-            ax.plot(s.get_domain_elements(), s.get_dom_elements(), label=n)
-        # Shrink current axis by 20%
-        pos = ax.get_position()
-        ax.set_position([pos.x0, pos.y0, pos.width * 0.8, pos.height])
-        ax.grid(True, which='both', alpha=0.4)
-        ax.set_title(self.name)
-        ax.set(xlabel='x', ylabel='$\mu (x)$')
-        # Put a legend to the right of the current axis
-        ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-        if show:
-            plt.show()
+        Plots a graphical representation of the fuzzy variable, see `fuzzy_plot.plot_variable`
+        """
+        from .fuzzy_plot import plot_variable
+        plot_variable(self, ax, show)
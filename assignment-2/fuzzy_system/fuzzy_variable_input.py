@@ -1,31 +1,53 @@
+from typing import Any, Dict
+from numpy.typing import NDArray
 from .fuzzy_variable import FuzzyVariable
 
 
 class FuzzyVariableInput(FuzzyVariable):
 
-    def __init__(self, name: str, min_val: float, max_val: float, res: int) -> None:
-        super().__init__(name, min_val, max_val, res)
+    def __init__(self, name: str, min_val: float, max_val: float, res: int, *, domain: NDArray = None) -> None:
+        super().__init__(name, min_val, max_val, res, domain=domain)
 
-    def fuzzify(self, value: float) -> None:
+    def fuzzify(self, value: float, context: Any = None, active: Any = None) -> None:
         """
         Performs fuzzification of the variable. used when the variable is an input one
+        :param value: input value for the variable
+        :param context: the FuzzyContext of the inference, None stores the degrees of membership in the sets
+        :param active: optional booleans, one per set, False when `value` is known to be outside the set support.
+                       The lookup of those sets is skipped and their degree of membership is 0
         """
         # get dom for each set and store it - it will be required for each rule
-        for set_name, f_set in self.sets.items():
-            f_set.last_dom_value = f_set[value]
+        if context is None:
+            for set_name, f_set in self.sets.items():
+                f_set.last_dom_value = f_set[value]
+        elif active is None:
+            for set_name, f_set in self.sets.items():
+                context.set_dom(f_set, f_set[value])
+        else:
+            for f_set, is_active in zip(self.sets.values(), active):
+                context.set_dom(f_set, f_set[value] if is_active else 0)
+
+    def fuzzify_batch(self, values: NDArray) -> Dict[str, NDArray]:
+        """
+        Performs fuzzification of an array of values of the variable.
+        Nothing is stored in the sets, the degrees of membership are returned instead
+        :param values: array of input values for the variable
+        :return: a dict having the form {set_name: array of degree-of-membership values, ...}
+        """
+        return {set_name: f_set.get_dom_values(values) for set_name, f_set in self.sets.items()}
 
-    def fuzzify_info(self, value: float) -> str:
+    def fuzzify_info(self, value: float, context: Any = None) -> str:
         """
         Performs fuzzification of the variable. used when the
         variable is an input one
         :param value: input value for the variable
+        :param context: the FuzzyContext of the inference, None stores the degrees of membership in the sets
         """
         # get dom for each set and store it - it will be required for each rule
-        for set_name, f_set in self.sets.items():
-            f_set.last_dom_value = f_set[value]
+        self.fuzzify(value, context)
         res = [self.name, '\n']
         for _, f_set in self.sets.items():
             res.append(f_set.name)
-            res.append(str(f_set.last_dom_value))
+            res.append(str(f_set.last_dom_value if context is None else context.get_dom(f_set)))
             res.append('\n')
         return ' '.join(res)
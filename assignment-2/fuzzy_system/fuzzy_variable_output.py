@@ -1,21 +1,235 @@
-from typing import Any, Tuple
+from typing import Any, List, Tuple
+from numpy.typing import NDArray
+import numpy as np
 from .fuzzy_variable import FuzzyVariable
-from .fuzzy_set import FuzzySet
+from .fuzzy_set import FuzzySet, cell_weights
 
 
 class FuzzyVariableOutput(FuzzyVariable):
-    def __init__(self, name: str, min_val: float, max_val: float, res: int) -> None:
-        super().__init__(name, min_val, max_val, res)
-        self.output_distribution = FuzzySet(name, min_val, max_val, res)
+    # defuzzifiers working on the sampled output distribution
+    SAMPLED_DEFUZZIFIERS = ('cog', 'mom', 'bisector')
+    # defuzzifiers working on the breakpoints and clipping heights of the fired consequent sets
+    PARAMETRIC_DEFUZZIFIERS = ('centroid', 'peaks')
 
-    def clear_output_distribution(self) -> None:
-        self.output_distribution.clear_set()
+    def __init__(self, name: str, min_val: float, max_val: float, res: int, defuzzifier: str = 'cog',
+                 *, domain: NDArray = None) -> None:
+        """
+        Creates a new output variable
+        :param name: the name of variable
+        :param min_val: minimum value of variable
+        :param max_val: maximum value of variable
+        :param res: resolution of variable
+        :param defuzzifier: the defuzzification method:
+                            'cog' -- center-of-gravity of the sampled output distribution
+                            'mom' -- mean-of-maximum of the sampled output distribution
+                            'bisector' -- bisector-of-area of the sampled output distribution
+                            'centroid' -- exact center-of-gravity computed in closed form, no sampling
+                            'peaks' -- average of the consequent peaks weighted by their clipping heights
+        :param domain: increasing domain values to use instead of `res` evenly spaced ones,
+                       see also `breakpoint_domain` and `adapt_domain`
+        """
+        super().__init__(name, min_val, max_val, res, domain=domain)
+        if defuzzifier not in self.SAMPLED_DEFUZZIFIERS + self.PARAMETRIC_DEFUZZIFIERS:
+            raise Exception(f'{defuzzifier}: unknown defuzzifier!')
+        self.defuzzifier = defuzzifier
+        # the output distribution is preallocated once and clipped and max-merged in place during inference
+        self.output_distribution = FuzzySet(name, self.min_val, self.max_val, self.res, domain=self._domain)
+        self._clipped = np.zeros(self.output_distribution.dom.shape)   # scratch buffer for a clipped consequent
+        self._heights = {}  # the clipping height of each fired consequent set, {FuzzySet: float, ...}
+        self._sampled = {}  # the sampled dom of each parametric consequent set, {FuzzySet: (version, dom), ...}
+
+    def set_domain(self, domain: NDArray) -> None:
+        super().set_domain(domain)
+        self.output_distribution = FuzzySet(self.name, self.min_val, self.max_val, self.res, domain=self._domain)
+        self._clipped = np.zeros(self.output_distribution.dom.shape)
+        self._sampled = {}
+
+    def sampled_dom(self, f_set: FuzzySet) -> NDArray:
+        """
+        The degrees of membership of a consequent set over the domain. A parametric set is sampled once
+        and sampled again only when its `version` changes, instead of on every fired rule
+        :param f_set: the consequent fuzzy set
+        :return: the read-only sampled degrees of membership
+        """
+        if not f_set.parametric:
+            return f_set.dom
+        cached = self._sampled.get(f_set)
+        if cached is None or cached[0] != f_set.version:
+            dom = f_set.dom
+            dom.flags.writeable = False
+            cached = self._sampled[f_set] = (f_set.version, dom)
+        return cached[1]
+
+    def adapt_domain(self, tolerance: float, max_res: int = 4097, n_samples: int = 256, seed: Any = 0) -> int:
+        """
+        Moves the variable onto the smallest `breakpoint_domain` whose center-of-gravity error stays below `tolerance`.
+        The error is measured against the exact centroid (see `FuzzySet.defuzzify_centroid_union`) of random
+        clippings of the sets, so all the sets must have breakpoints
+        :param tolerance: the maximum absolute error of the crisp output
+        :param max_res: the maximum number of domain values
+        :param n_samples: the number of random clippings the error is measured on
+        :param seed: seed of the random generator
+        :return: the number of domain values chosen
+        """
+        f_sets = list(self.sets.values())
+        rng = np.random.default_rng(seed)
+        heights = rng.uniform(0, 1, (n_samples, len(f_sets))) * (rng.uniform(0, 1, (n_samples, len(f_sets))) < 0.5)
+        heights = heights[heights.sum(axis=1) > 0]
+        exact = np.array([FuzzySet.defuzzify_centroid_union(f_sets, row, self.min_val, self.max_val)
+                          for row in heights])
+
+        def error(res: int) -> float:
+            domain = self.breakpoint_domain(res)
+            areas, moments = cell_weights(domain)
+            distribution = np.zeros((len(heights), res))
+            for k, f_set in enumerate(f_sets):
+                np.maximum(distribution, np.minimum(heights[:, k, None], f_set.membership(domain)), out=distribution)
+            return np.max(np.abs(distribution @ moments / (distribution @ areas) - exact))
+
+        # double the resolution until the error is met, then bisect down to the smallest one
+        lo = hi = len(self.breakpoints())
+        while error(hi) > tolerance:
+            if hi >= max_res:
+                raise Exception(f'{self.name}: the tolerance {tolerance} needs more than {max_res} domain values!')
+            lo, hi = hi, min(2 * hi, max_res)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if error(mid) <= tolerance:
+                hi = mid
+            else:
+                lo = mid + 1
+        self.set_domain(self.breakpoint_domain(hi))
+        return hi
+
+    def get_output_distribution(self, context: Any = None) -> FuzzySet:
+        """
+        The output distribution aggregated by the inference
+        :param context: the FuzzyContext of the inference, None returns `self.output_distribution`
+        """
+        if context is None:
+            return self.output_distribution
+        return context.get_output_buffers(self)[0]
+
+    def get_heights(self, context: Any = None) -> dict:
+        """
+        The clipping height of each fired consequent set
+        :param context: the FuzzyContext of the inference, None returns the heights stored in the variable
+        :return: a dict having the form {FuzzySet: height, ...}
+        """
+        if context is None:
+            return self._heights
+        return context.get_heights(self)
+
+    def clear_output_distribution(self, context: Any = None) -> None:
+        self.get_output_distribution(context).clear_set()
+        self.get_heights(context).clear()
 
     def add_rule_contribution(self, rule_consequence: Any) -> None:
-        self.output_distribution = self.output_distribution.union(rule_consequence)
+        """
+        Unites a rule consequence with the output distribution, in place
+        :param rule_consequence: the fuzzy set concluded by the rule
+        """
+        np.maximum(self.output_distribution.dom, rule_consequence.dom, out=self.output_distribution.dom)
+
+    def add_clipped_contribution(self, f_set: FuzzySet, dom: float, context: Any = None) -> None:
+        """
+        Unites `f_set.min_scalar(dom)` with the output distribution without allocating the clipped set.
+        The parametric defuzzifiers only keep the clipping height of the set
+        :param f_set: the consequent fuzzy set
+        :param dom: degree of membership, or scalar value from the antecedent clauses
+        :param context: the FuzzyContext of the inference, None uses `self.output_distribution`
+        """
+        heights = self.get_heights(context)
+        if dom > heights.get(f_set, 0):
+            heights[f_set] = dom
+        if self.defuzzifier in self.PARAMETRIC_DEFUZZIFIERS:
+            return
+        if context is None:
+            distribution, clipped = self.output_distribution, self._clipped
+        else:
+            distribution, clipped = context.get_output_buffers(self)
+        np.minimum(self.sampled_dom(f_set), dom, out=clipped)
+        np.maximum(distribution.dom, clipped, out=distribution.dom)
+
+    def get_crisp_output(self, context: Any = None) -> Any:
+        if self.defuzzifier == 'cog':
+            return self.get_output_distribution(context).defuzzify_cog()
+        if self.defuzzifier == 'mom':
+            return self.get_output_distribution(context).defuzzify_mom()
+        if self.defuzzifier == 'bisector':
+            return self.get_output_distribution(context).defuzzify_bisector()
+        heights = self.get_heights(context)
+        if self.defuzzifier == 'centroid':
+            return FuzzySet.defuzzify_centroid_union(heights.keys(), heights.values(), self.min_val, self.max_val)
+        total = sum(heights.values())
+        if total == 0:
+            return np.nan
+        return sum(h * f_set.peak for f_set, h in heights.items()) / total
+
+    def get_crisp_output_info(self, context: Any = None) -> Tuple[Any, Any]:
+        # hand out a copy, the output distribution is reused by the next inference
+        distribution = self.get_output_distribution(context).min_scalar(1)
+        distribution.name = self.name
+        if self.defuzzifier in self.PARAMETRIC_DEFUZZIFIERS:
+            # the distribution was not aggregated, build it from the clipping heights
+            for f_set, h in self.get_heights(context).items():
+                np.maximum(distribution.dom, np.minimum(self.sampled_dom(f_set), h), out=distribution.dom)
+        return self.get_crisp_output(context), distribution
 
-    def get_crisp_output(self) -> Any:
-        return self.output_distribution.defuzzify_cog()
+    def get_crisp_output_batch(self, rule_strengths: NDArray, f_sets: List[FuzzySet]) -> NDArray:
+        """
+        Aggregates and defuzzifies a batch of rule firings without touching `self.output_distribution`
+        :param rule_strengths: N x K array, the strength of the K rules concluding on this variable for N samples
+        :param f_sets: the K consequent sets, in the same order as the columns of `rule_strengths`
+        :return: array of N crisp outputs
+        """
+        if self.defuzzifier in self.PARAMETRIC_DEFUZZIFIERS:
+            # clipping height of each distinct consequent set
+            unique_sets = list(dict.fromkeys(f_sets))
+            heights = np.zeros((rule_strengths.shape[0], len(unique_sets)))
+            for k, f_set in enumerate(f_sets):
+                j = unique_sets.index(f_set)
+                np.maximum(heights[:, j], rule_strengths[:, k], out=heights[:, j])
+            if self.defuzzifier == 'peaks':
+                num = heights @ np.array([f_set.peak for f_set in unique_sets])
+                den = heights.sum(axis=1)
+                return np.divide(num, den, out=np.full_like(num, np.nan), where=den != 0)
+            return np.array([FuzzySet.defuzzify_centroid_union(unique_sets, row, self.min_val, self.max_val)
+                             for row in heights])
+        distribution = np.zeros((rule_strengths.shape[0], self.res))
+        clipped = np.empty_like(distribution)
+        for k, f_set in enumerate(f_sets):
+            np.minimum(rule_strengths[:, k, None], self.sampled_dom(f_set), out=clipped)
+            np.maximum(distribution, clipped, out=distribution)
+        return self.defuzzify_distributions(distribution)
 
-    def get_crisp_output_info(self) -> Tuple[Any, Any]:
-        return self.output_distribution.defuzzify_cog(), self.output_distribution
+    def defuzzify_distributions(self, distribution: NDArray) -> NDArray:
+        """
+        Defuzzifies a batch of output distributions sampled over the domain, with a sampled defuzzifier
+        :param distribution: N x res array, one output distribution per row
+        :return: array of N crisp outputs
+        """
+        domain = self.output_distribution.domain
+        uniform = self.output_distribution.uniform
+        if not uniform:
+            # exact integration of the piecewise-linear distributions, see `FuzzySet.defuzzify_cog`
+            areas, moments = cell_weights(domain)
+        if self.defuzzifier == 'mom':
+            maximum = distribution == distribution.max(axis=1, keepdims=True)
+            if not uniform:
+                maximum = maximum * areas
+            result = maximum @ domain / maximum.sum(axis=1)
+            result[distribution.max(axis=1) == 0] = np.nan
+            return result
+        if self.defuzzifier == 'bisector':
+            cumulative = np.cumsum(distribution if uniform else distribution * areas, axis=1)
+            half = cumulative[:, -1:] / 2
+            result = domain[np.argmax(cumulative >= half, axis=1)]
+            result[cumulative[:, -1] == 0] = np.nan
+            return result
+        if not uniform:
+            num, den = distribution @ moments, distribution @ areas
+        else:
+            num, den = distribution @ domain, distribution.sum(axis=1)
+        # NaN for the empty distributions, as the scalar defuzzification
+        return np.divide(num, den, out=np.full_like(num, np.nan), where=den != 0)
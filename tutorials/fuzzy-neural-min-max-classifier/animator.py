@@ -0,0 +1,111 @@
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.animation as ani
+
+
+class Animator:
+    """
+    An animator class only for animating 2D hyperboxes
+    """
+
+    def __init__(self, box_history, train_patterns, classes, frame_rate, exp_bound, sensitivity,
+                 filename='fuzzy_animation', verbose=True):
+        # Customizable parameters
+        assert len(box_history) == len(
+            train_patterns), f'{len(box_history)} (box-history) != {len(train_patterns)} (train_patterns)'
+        assert len(train_patterns[0][0]) == 2, 'Only 2D points are allowed.'
+
+        self.fig = plt.figure()
+        self.fig.set_dpi(100)
+        self.fig.set_size_inches(7, 6.5)
+        self.fig.suptitle('Fuzzy min-max classifier')
+        if filename == '':
+            filename = 'fuzzy_animation'
+        self.filename = filename + '.gif'
+        self.box_history = box_history
+        self.train_patterns = train_patterns
+        self.classes = classes
+        self.verbose = verbose
+
+        self.frames = np.ravel(np.array([[i] * frame_rate for i in range(len(box_history))]))
+        self.total = len(box_history)
+
+        self.ax = plt.axes(xlim=(0, 1), ylim=(0, 1))
+        self.ax.set_title('θ = {} and γ = {}'.format(exp_bound, sensitivity))
+        self.rectangles = []
+        self.scatters = []
+        self.colormap = [np.array([255, 0, 0]), np.array([0, 0, 255])] + [self._get_random_color() for i in
+                                                                          range(len(np.unique(classes)) - 2)]
+
+        for i in range((len(train_patterns))):
+            x, y = train_patterns[i]
+            y = int(y)
+            if y == 0:
+                self.scatters.append(plt.scatter(-1, -1, c=tuple(self.colormap[y] / 255)))
+            else:
+                self.scatters.append(plt.scatter(-1, -1, c=tuple(self.colormap[y] / 255)))
+
+        for _class in classes:
+            if _class == 0:
+                self.rectangles.append(plt.Rectangle((0, 0), 0, 0, fill=False, color='r'))
+            else:
+                self.rectangles.append(plt.Rectangle((0, 0), 0, 0, fill=False, color='b'))
+
+        if self.verbose:
+            print('{:<20}: {:<10}'.format('Total Boxes', len(self.rectangles)))
+            print('{:<20}: {:<10}'.format('Points to plot', len(self.scatters)))
+
+    @staticmethod
+    def _get_random_color():
+        r = lambda: np.random.randint(0, 255)
+        return np.array([r(), r(), r()])
+
+    @staticmethod
+    def box_to_rect(box):
+        vj, wj = box
+        height = wj[1] - vj[1]
+        width = wj[0] - vj[0]
+        return tuple(vj), width, height
+
+    def init(self):
+        for i in self.rectangles:
+            self.ax.add_patch(i)
+
+        return tuple(self.rectangles) + tuple(self.scatters)
+
+    def _animate(self, i):
+        hyperboxes = self.box_history[i]
+        # Plot training point
+        x, y = self.train_patterns[i]
+        self.scatters[i].set_offsets(tuple(x))
+        for box in range(len(hyperboxes)):
+            base, width, height = self.box_to_rect(hyperboxes[box])
+            self.rectangles[box].set_xy(base)
+            if width == 0:
+                width = 0.02
+            if height == 0:
+                height = 0.02
+
+            self.rectangles[box].set_width(width)
+            self.rectangles[box].set_height(height)
+
+        if self.verbose:
+            print('{:<20}: {}/{}'.format('Animating frame', i + 1, self.total), end='\r')
+
+        return tuple(self.rectangles) + tuple(self.scatters)
+
+    def animate(self):
+        """
+        Main function to start animation
+        """
+        anim = ani.FuncAnimation(self.fig, self._animate,
+                                 init_func=self.init,
+                                 frames=self.frames,
+                                 interval=20,
+                                 blit=True)
+        writer = ani.PillowWriter(fps=20)
+        anim.save(self.filename, writer=writer)
+
+        if self.verbose:
+            print('Animation complete! Video saved at {}'.format(os.path.join(os.getcwd(), self.filename)))
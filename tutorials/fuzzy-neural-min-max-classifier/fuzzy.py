@@ -1,208 +1,194 @@
-import os
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as ani
-
-
-class Animator:
-    """
-    An animator class only for animating 2D hyperboxes
-    """
-
-    def __init__(self, box_history, train_patterns, classes, frame_rate, exp_bound, sensitivity,
-                 filename='fuzzy_animation', verbose=True):
-        # Customizable parameters
-        assert len(box_history) == len(
-            train_patterns), f'{len(box_history)} (box-history) != {len(train_patterns)} (train_patterns)'
-        assert len(train_patterns[0][0]) == 2, 'Only 2D points are allowed.'
-
-        self.fig = plt.figure()
-        self.fig.set_dpi(100)
-        self.fig.set_size_inches(7, 6.5)
-        self.fig.suptitle('Fuzzy min-max classifier')
-        if filename == '':
-            filename = 'fuzzy_animation'
-        self.filename = filename + '.gif'
-        self.box_history = box_history
-        self.train_patterns = train_patterns
-        self.classes = classes
-        self.verbose = verbose
-
-        self.frames = np.ravel(np.array([[i] * frame_rate for i in range(len(box_history))]))
-        self.total = len(box_history)
-
-        self.ax = plt.axes(xlim=(0, 1), ylim=(0, 1))
-        self.ax.set_title('θ = {} and γ = {}'.format(exp_bound, sensitivity))
-        self.rectangles = []
-        self.scatters = []
-        self.colormap = [np.array([255, 0, 0]), np.array([0, 0, 255])] + [self._get_random_color() for i in
-                                                                          range(len(np.unique(classes)) - 2)]
-
-        for i in range((len(train_patterns))):
-            x, y = train_patterns[i]
-            y = int(y)
-            if y == 0:
-                self.scatters.append(plt.scatter(-1, -1, c=tuple(self.colormap[y] / 255)))
-            else:
-                self.scatters.append(plt.scatter(-1, -1, c=tuple(self.colormap[y] / 255)))
-
-        for _class in classes:
-            if _class == 0:
-                self.rectangles.append(plt.Rectangle((0, 0), 0, 0, fill=False, color='r'))
-            else:
-                self.rectangles.append(plt.Rectangle((0, 0), 0, 0, fill=False, color='b'))
-
-        if self.verbose:
-            print('{:<20}: {:<10}'.format('Total Boxes', len(self.rectangles)))
-            print('{:<20}: {:<10}'.format('Points to plot', len(self.scatters)))
-
-    @staticmethod
-    def _get_random_color():
-        r = lambda: np.random.randint(0, 255)
-        return np.array([r(), r(), r()])
-
-    @staticmethod
-    def box_to_rect(box):
-        vj, wj = box
-        height = wj[1] - vj[1]
-        width = wj[0] - vj[0]
-        return tuple(vj), width, height
 
-    def init(self):
-        for i in self.rectangles:
-            self.ax.add_patch(i)
-
-        return tuple(self.rectangles) + tuple(self.scatters)
-
-    def _animate(self, i):
-        hyperboxes = self.box_history[i]
-        # Plot training point
-        x, y = self.train_patterns[i]
-        self.scatters[i].set_offsets(tuple(x))
-        for box in range(len(hyperboxes)):
-            base, width, height = self.box_to_rect(hyperboxes[box])
-            self.rectangles[box].set_xy(base)
-            if width == 0:
-                width = 0.02
-            if height == 0:
-                height = 0.02
-
-            self.rectangles[box].set_width(width)
-            self.rectangles[box].set_height(height)
-
-        if self.verbose:
-            print('{:<20}: {}/{}'.format('Animating frame', i + 1, self.total), end='\r')
-
-        return tuple(self.rectangles) + tuple(self.scatters)
-
-    def animate(self):
-        """
-        Main function to start animation
-        """
-        anim = ani.FuncAnimation(self.fig, self._animate,
-                                 init_func=self.init,
-                                 frames=self.frames,
-                                 interval=20,
-                                 blit=True)
-        writer = ani.PillowWriter(fps=20)
-        anim.save(self.filename, writer=writer)
 
-        if self.verbose:
-            print('Animation complete! Video saved at {}'.format(os.path.join(os.getcwd(), self.filename)))
+def __getattr__(name):
+    # the Animator (and matplotlib) is only imported when it is used
+    if name == 'Animator':
+        from animator import Animator
+        return Animator
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class FuzzyMMC:
 
-    def __init__(self, sensitivity=1, exp_bound=1, animate=False):
+    def __init__(self, sensitivity=1, exp_bound=1, animate=False, grid=None):
         """
         Constructor for FuzzyMMC class
+        grid is an optional HyperboxGrid, used to only consider the nearby hyperboxes in train_pattern and predict1
         """
         self.sensitivity = sensitivity
-        self.hyperboxes = None
+        self.grid = grid
+        # Backing stores of the hyperboxes and of their classes, the first self._n_boxes rows are in use
+        self._hyperboxes = None
+        self._classes = None
+        self._n_boxes = 0
+        self._class_set = set()     # the distinct classes of the hyperboxes
         self.is_animate = animate
-        self.classes = np.array([])
         self.exp_bound = exp_bound
 
         if self.animate:
             self.box_history = []
             self.train_patterns = []
 
-    def membership(self, pattern):
+    @property
+    def hyperboxes(self):
         """
-        Calculates membership values a pattern
-        Returns a ndarray of membership values of all hyperboxes
+        B x 2 x d ndarray of the min-pt and max-pt of the hyperboxes, None before training
+        It is a view of the backing store, that stays valid until the next hyperbox is created
         """
-        min_pts = self.hyperboxes[:, 0, :]
-        max_pts = self.hyperboxes[:, 1, :]
-
-        a = np.maximum(0, (1 - np.maximum(0, (self.sensitivity * np.minimum(1, pattern - max_pts)))))
-        b = np.maximum(0, (1 - np.maximum(0, (self.sensitivity * np.minimum(1, min_pts - pattern)))))
-
-        return np.sum(a + b, axis=1) / (2 * len(pattern))
-
-    def overlap_contract(self, index):
+        if self._hyperboxes is None:
+            return None
+        return self._hyperboxes[:self._n_boxes]
+
+    @hyperboxes.setter
+    def hyperboxes(self, hyperboxes):
+        self._hyperboxes = None if hyperboxes is None else np.array(hyperboxes)
+        self._n_boxes = 0 if hyperboxes is None else len(self._hyperboxes)
+        self._class_set = set(self.classes.tolist())
+        self.build_grid()
+
+    @property
+    def classes(self):
         """
-        Check if any class-wise dissimilar hyperboxes overlap
+        ndarray of the classes of the hyperboxes, a view of the backing store like hyperboxes
         """
-        contracted = False
-        for test_box in range(len(self.hyperboxes)):
-
-            if self.classes[test_box] == self.classes[index]:
-                # Ignore same class hyperbox overlap
-                continue
-
-            expanded_box = self.hyperboxes[index]
-            box = self.hyperboxes[test_box]
+        if self._classes is None:
+            return np.array([])
+        return self._classes[:self._n_boxes]
 
-            # Refactor for vectorization
-            vj, wj = expanded_box
-            vk, wk = box
+    @classes.setter
+    def classes(self, classes):
+        self._classes = np.array(classes)
+        self._class_set = set(self.classes.tolist())
+        self.build_grid()
 
-            delta_new = delta_old = 1
-            min_overlap_index = -1
-            for i in range(len(vj)):
-                if vj[i] < vk[i] < wj[i] < wk[i]:
-                    delta_new = min(delta_old, wj[i] - vk[i])
-
-                elif vk[i] < vj[i] < wk[i] < wj[i]:
-                    delta_new = min(delta_old, wk[i] - vj[i])
-
-                elif vj[i] < vk[i] < wk[i] < wj[i]:
-                    delta_new = min(delta_old, min(wj[i] - vk[i], wk[i] - vj[i]))
+    def build_grid(self):
+        """
+        Registers all the hyperboxes in the grid, if any
+        """
+        if self.grid is None:
+            return
+        self.grid.clear()
+        if self._classes is not None and len(self._classes) >= self._n_boxes:
+            for index, (box, target) in enumerate(zip(self.hyperboxes, self.classes)):
+                self.grid.insert(index, target, box[0], box[1])
 
-                elif vk[i] < vj[i] < wj[i] < wk[i]:
-                    delta_new = min(delta_old, min(wj[i] - vk[i], wk[i] - vj[i]))
+    @staticmethod
+    def _append(store, n, item):
+        """
+        Writes item after the n items in use of store
+        Returns store, or a copy of twice the capacity (and of a dtype holding item) when store is full
+        """
+        item = np.asarray(item)
+        dtype = item.dtype if store is None or n == 0 else np.result_type(store.dtype, item.dtype)
+        if store is None or n == len(store) or dtype != store.dtype:
+            grown = np.empty((max(1, 2 * n),) + item.shape, dtype=dtype)
+            if n:
+                grown[:n] = store[:n]
+            store = grown
+        store[n] = item
+        return store
+
+    def add_hyperbox(self, X, target):
+        """
+        Creates the hyperbox [X, X] of class target, in amortized O(d) time
+        Returns the index of the new hyperbox
+        """
+        index = self._n_boxes
+        self._hyperboxes = self._append(self._hyperboxes, index, [X, X])
+        self._classes = self._append(self._classes, index, target)
+        self._n_boxes += 1
+        self._class_set.add(target)
+        if self.grid is not None:
+            self.grid.insert(index, target, X, X)
 
-                if delta_old - delta_new > 0:
-                    min_overlap_index = i
-                    delta_old = delta_new
+        return index
 
-            if min_overlap_index >= 0:
-                i = min_overlap_index
-                # We need to contract the expanded box
-                if vj[i] < vk[i] < wj[i] < wk[i]:
-                    vk[i] = wj[i] = (vk[i] + wj[i]) / 2
+    def membership(self, pattern, boxes=None):
+        """
+        Calculates membership values a pattern
+        Returns a ndarray of membership values of all hyperboxes, or of the hyperboxes of indices boxes,
+        or a N x B ndarray when given N patterns as a N x d ndarray
+        """
+        hyperboxes = self.hyperboxes if boxes is None else self.hyperboxes[boxes]
+        min_pts = hyperboxes[:, 0, :]
+        max_pts = hyperboxes[:, 1, :]
+        pattern = np.asarray(pattern)
+        if pattern.ndim == 2:
+            pattern = pattern[:, None, :]
+
+        # a = max(0, 1 - max(0, sensitivity * min(1, pattern - max_pts))), and b likewise, computed in place
+        a = np.subtract(pattern, max_pts, dtype=float)
+        b = np.subtract(min_pts, pattern, dtype=float)
+        for c in (a, b):
+            np.minimum(c, 1, out=c)
+            np.multiply(c, self.sensitivity, out=c)
+            np.maximum(c, 0, out=c)
+            np.subtract(1, c, out=c)
+            np.maximum(c, 0, out=c)
+
+        return np.sum(np.add(a, b, out=a), axis=-1) / (2 * pattern.shape[-1])
 
-                elif vk[i] < vj[i] < wk[i] < wj[i]:
-                    vj[i] = wk[i] = (vj[i] + wk[i]) / 2
+    @staticmethod
+    def overlap(vj, wj, vk, wk):
+        """
+        Calculates the overlap of the box (vj, wj) with the boxes (vk, wk) along each dimension
+        Returns an ndarray shaped like vk, that is 1 where none of the four overlap cases holds
+        """
+        case1 = (vj < vk) & (vk < wj) & (wj < wk)
+        case2 = (vk < vj) & (vj < wk) & (wk < wj)
+        case34 = ((vj < vk) & (vk < wk) & (wk < wj)) | ((vk < vj) & (vj < wj) & (wj < wk))
+        return np.where(case1, wj - vk, np.where(case2, wk - vj, np.where(case34, np.minimum(wj - vk, wk - vj), 1.)))
 
-                elif vj[i] < vk[i] < wk[i] < wj[i]:
-                    if (wj[i] - vk[i]) > (wk[i] - vj[i]):
-                        vj[i] = wk[i]
+    def overlap_contract(self, index):
+        """
+        Check if any class-wise dissimilar hyperboxes overlap
+        The overlap test is done on all the other-class boxes at once, then the overlapping boxes are contracted
+        in order, each along its first dimension of minimum overlap
+        """
+        contracted = False
+        vj, wj = self.hyperboxes[index]
+        others = np.flatnonzero(self.classes != self.classes[index])
+        min_pts = self.hyperboxes[others, 0, :]
+        max_pts = self.hyperboxes[others, 1, :]
+        delta = self.overlap(vj, wj, min_pts, max_pts)
+
+        start = 0
+        while start < len(others):
+            overlapping = delta[start:].min(axis=1) < 1
+            if not overlapping.any():
+                break
+            row = start + np.argmax(overlapping)
+            i = np.argmin(delta[row])
+            vk, wk = self.hyperboxes[others[row]]
+            expanded = vj[i], wj[i]
+
+            # We need to contract the expanded box
+            if vj[i] < vk[i] < wj[i] < wk[i]:
+                vk[i] = wj[i] = (vk[i] + wj[i]) / 2
+
+            elif vk[i] < vj[i] < wk[i] < wj[i]:
+                vj[i] = wk[i] = (vj[i] + wk[i]) / 2
+
+            elif vj[i] < vk[i] < wk[i] < wj[i]:
+                if (wj[i] - vk[i]) > (wk[i] - vj[i]):
+                    vj[i] = wk[i]
 
-                    else:
-                        wj[i] = vk[i]
+                else:
+                    wj[i] = vk[i]
 
-                elif vk[i] < vj[i] < wj[i] < wk[i]:
-                    if (wk[i] - vj[i]) > (wj[i] - vk[i]):
-                        vk[i] = wj[i]
+            elif vk[i] < vj[i] < wj[i] < wk[i]:
+                if (wk[i] - vj[i]) > (wj[i] - vk[i]):
+                    vk[i] = wj[i]
 
-                    else:
-                        wk[i] = vj[i]
+                else:
+                    wk[i] = vj[i]
 
-                self.hyperboxes[test_box] = np.array([vk, wk])
-                self.hyperboxes[index] = np.array([vj, wj])
-                contracted = True
+            contracted = True
+            start = row + 1
+            if (vj[i], wj[i]) != expanded:
+                # Only dimension i of the expanded box has changed
+                delta[start:, i] = self.overlap(vj[i], wj[i], min_pts[start:, i], max_pts[start:, i])
 
         return contracted
 
@@ -214,45 +200,42 @@ class FuzzyMMC:
         """
         target = Y
 
-        if target not in self.classes:
+        if target not in self._class_set:
 
             # Create a new hyberbox
-            if self.hyperboxes is not None:
-                self.hyperboxes = np.vstack((self.hyperboxes, np.array([[X, X]])))
-                self.classes = np.hstack((self.classes, np.array([target])))
-
-            else:
-                self.hyperboxes = np.array([[X, X]])
-                self.classes = np.array([target])
+            self.add_hyperbox(X, target)
 
             if self.is_animate:
                 self.box_history.append(np.copy(self.hyperboxes))
                 self.train_patterns.append((X, Y))
         else:
 
-            memberships = self.membership(X)
-            memberships[np.where(self.classes != target)] = 0
-            memberships = sorted(list(enumerate(memberships)), key=lambda x: x[1], reverse=True)
-
-            # Expand the most suitable hyperbox
-            count = 0
-            while True:
-                index = memberships[count][0]
-                min_new = np.minimum(self.hyperboxes[index, 0, :], X)
-                max_new = np.maximum(self.hyperboxes[index, 1, :], X)
-
-                if self.exp_bound * len(np.unique(self.classes)) >= np.sum(max_new - min_new):
-                    self.hyperboxes[index, 0] = min_new
-                    self.hyperboxes[index, 1] = max_new
-                    break
-                else:
-                    count += 1
+            # The same-class hyperboxes, in increasing index order
+            max_size = self.exp_bound * len(self._class_set)
+            if self.grid is None:
+                candidates = np.flatnonzero(self.classes == target)
+            else:
+                # A box meeting the expansion criterion is within exp_bound * classes of X in every dimension
+                candidates = self.grid.query(target, np.subtract(X, max_size), np.add(X, max_size))
+
+            # Expansion criterion of all the candidates
+            boxes = self.hyperboxes[candidates]
+            min_new = np.minimum(boxes[:, 0, :], X)
+            max_new = np.maximum(boxes[:, 1, :], X)
+            admissible = max_size >= np.sum(max_new - min_new, axis=1)
+
+            if np.any(admissible):
+                # Expand the admissible hyperbox of highest membership, the first one on ties
+                memberships = self.membership(X, candidates)
+                best = np.argmax(np.where(admissible, memberships, -1))
+                index = candidates[best]
+                self.hyperboxes[index, 0] = min_new[best]
+                self.hyperboxes[index, 1] = max_new[best]
+                if self.grid is not None:
+                    self.grid.insert(index, target, min_new[best], max_new[best])
 
-                if count == len(memberships):
-                    self.hyperboxes = np.vstack((self.hyperboxes, np.array([[X, X]])))
-                    self.classes = np.hstack((self.classes, np.array([target])))
-                    index = len(self.hyperboxes) - 1
-                    break
+            else:
+                index = self.add_hyperbox(X, target)
 
             # Overlap test
             if self.is_animate:
@@ -276,6 +259,9 @@ class FuzzyMMC:
         """
         Predict the class of the pattern X
         """
+        if self.grid is not None:
+            return self.predict1_grid(X)
+
         classes = np.unique(self.classes)
         results = []
         memberships = self.membership(X)
@@ -292,30 +278,78 @@ class FuzzyMMC:
 
         return max_prediction, self.classes[pred_class]
 
+    def predict1_grid(self, X):
+        """
+        Predict the class of the pattern X like predict1, visiting the grid cells by increasing distance from X
+        The search stops when no hyperbox left can reach the best membership found: a hyperbox at least r away
+        from X in some dimension has a membership of at most 1 - min(1, sensitivity * min(1, r)) / 2d
+        """
+        X = np.asarray(X, dtype=float)
+        boxes, memberships = [], []
+        max_prediction = 0
+        for k, ring in self.grid.rings(X):
+            if len(ring):
+                boxes.append(ring)
+                memberships.append(self.membership(X, ring))
+                max_prediction = max(max_prediction, np.max(memberships[-1]))
+
+            bound = 1 - min(1, self.sensitivity * min(1, k * self.grid.width)) / (2 * len(X))
+            if max_prediction > bound + 1e-12:
+                break
+
+        if max_prediction == 0:
+            return 0, self.classes[0]
+
+        # The first class in sorted order wins ties
+        classes = self.classes[np.concatenate(boxes)]
+        return max_prediction, np.min(classes[np.concatenate(memberships) == max_prediction])
+
+    def predict(self, X, chunk_size=None):
+        """
+        Predict the classes of the patterns X, like predict1 for each pattern
+        The N x B membership matrix is computed by chunks of patterns, and reduced to the maximum membership
+        of each class with one grouped reduction over the hyperboxes sorted by class; the grid is not used
+        chunk_size is the number of patterns per chunk, by default chunks hold about 2**16 (pattern, box, dimension)
+        values, i.e. 512 kB per temporary array, which stays in cache
+        Returns the ndarray of the maximum memberships and the ndarray of the predicted classes
+        """
+        X = np.asarray(X, dtype=float)
+        if chunk_size is None:
+            chunk_size = max(1, 2 ** 16 // self.hyperboxes[:, 0, :].size)
+
+        # Hyperboxes sorted by class, with the first box of each class
+        order = np.argsort(self.classes, kind='stable')
+        sorted_classes = self.classes[order]
+        starts = np.flatnonzero(np.r_[True, sorted_classes[1:] != sorted_classes[:-1]])
+        classes = sorted_classes[starts]
+
+        max_pred = np.empty(len(X))
+        class_pred = np.empty(len(X), dtype=self.classes.dtype)
+        for i in range(0, len(X), chunk_size):
+            memberships = self.membership(X[i:i + chunk_size])
+            class_memberships = np.maximum.reduceat(memberships[:, order], starts, axis=1)
+            # The first class in sorted order wins ties, and the first box when no box has a positive membership
+            best = np.argmax(class_memberships, axis=1)
+            max_pred[i:i + chunk_size] = class_memberships[np.arange(len(best)), best]
+            class_pred[i:i + chunk_size] = np.where(max_pred[i:i + chunk_size] > 0, classes[best], self.classes[0])
+
+        return max_pred, class_pred
+
     def predict2(self, X):
         """
         Predict the class of the pattern X
         """
-        max_pred = []
-        class_pred = []
-        for x in X:
-            mx, cls = self.predict1(x)
-            max_pred.append(mx)
-            class_pred.append(cls)
+        max_pred, class_pred = self.predict(X)
 
-        return max_pred, class_pred
+        return list(max_pred), list(class_pred)
 
     def score(self, X, Y):
         """
         Scores the classifier
         """
-        count = 0
-        for x, y in zip(X, Y):
-            _, pred = self.predict1(x)
-            if y == pred:
-                count += 1
+        _, pred = self.predict(X)
 
-        return count / len(Y)
+        return np.count_nonzero(pred == np.asarray(Y)) / len(Y)
 
     def animate(self, frame_rate=10, filename='', verbose=True):
         """
@@ -323,6 +357,7 @@ class FuzzyMMC:
         NOTE: Only possible when working with 2 dimensional patterns
         """
         if self.is_animate:
+            from animator import Animator
             animator = Animator(box_history=self.box_history,
                                 train_patterns=self.train_patterns,
                                 classes=self.classes,
@@ -0,0 +1,84 @@
+import itertools
+import numpy as np
+
+
+class HyperboxGrid:
+    """
+    A uniform grid over the unit hypercube indexing the hyperboxes of each class
+    Only the first `dims` dimensions are gridded, each into `cells` cells. A hyperbox is registered in every cell
+    its projection overlaps; points and boxes outside the unit hypercube fall into the border cells
+    A membership only drops by 1/2d per dimension of distance, so prediction visits more rings as d grows:
+    the grid pays off for models of many hyperboxes in few dimensions
+    """
+
+    def __init__(self, cells=10, dims=3):
+        """
+        Constructor for HyperboxGrid class
+        """
+        self.cells = cells
+        self.dims = dims
+        self.width = 1 / cells
+        self.grids = {}     # {class: {cell: set of hyperbox indices, ...}, ...}
+        self.ranges = {}    # the range of cells a hyperbox is registered in, {index: (low cell, high cell), ...}
+
+    def cell(self, point):
+        """
+        Returns the cell coordinates of a point, as a tuple
+        """
+        coords = np.floor(np.asarray(point, dtype=float)[:self.dims] * self.cells).astype(int)
+        return tuple(np.clip(coords, 0, self.cells - 1).tolist())
+
+    def clear(self):
+        self.grids = {}
+        self.ranges = {}
+
+    def insert(self, index, target, min_pt, max_pt):
+        """
+        Registers a new hyperbox, or an expanded one, of class target
+        A contracted hyperbox is left in its former cells, which still cover it
+        """
+        low, high = self.cell(min_pt), self.cell(max_pt)
+        if index in self.ranges:
+            old_low, old_high = self.ranges[index]
+            if all(l >= ol for l, ol in zip(low, old_low)) and all(h <= oh for h, oh in zip(high, old_high)):
+                return
+            low = tuple(map(min, low, old_low))
+            high = tuple(map(max, high, old_high))
+        self.ranges[index] = low, high
+
+        grid = self.grids.setdefault(target, {})
+        for cell in itertools.product(*(range(l, h + 1) for l, h in zip(low, high))):
+            grid.setdefault(cell, set()).add(index)
+
+    def query(self, target, min_pt, max_pt):
+        """
+        Returns the sorted ndarray of the indices of the class target hyperboxes that may intersect
+        the box (min_pt, max_pt)
+        """
+        grid = self.grids.get(target, {})
+        low, high = self.cell(min_pt), self.cell(max_pt)
+        found = set()
+        for cell in itertools.product(*(range(l, h + 1) for l, h in zip(low, high))):
+            found.update(grid.get(cell, ()))
+
+        return np.array(sorted(found), dtype=int)
+
+    def rings(self, point):
+        """
+        Yields (k, indices) for k = 0, 1, ... where indices is the sorted ndarray of the hyperboxes, of any class,
+        first met in the cells k cells away from the cell of point (Chebyshev distance)
+        Once ring k is yielded, the hyperboxes not met yet are at least k * self.width away from point
+        """
+        center = self.cell(point)
+        seen = set()
+        for k in range(self.cells):
+            found = set()
+            ranges = (range(max(0, c - k), min(self.cells, c + k + 1)) for c in center)
+            for cell in itertools.product(*ranges):
+                if max(abs(a - c) for a, c in zip(cell, center)) == k:
+                    for grid in self.grids.values():
+                        found.update(grid.get(cell, ()))
+            found -= seen
+            seen |= found
+
+            yield k, np.array(sorted(found), dtype=int)